@@ -0,0 +1,232 @@
+import html
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+# Synthetic LinkedIn job search and job view pages with the same selectors as
+# the real ones: the lazily rendered `jobs-search-results-list` scroll
+# container and `.description__text` blocks with a "See more" button.
+
+TITLES = ["Data Scientist", "Senior Data Scientist", "Machine Learning Engineer", "Data Analyst", "Applied Scientist"]
+COMPANIES = ["Acme", "Globex", "Initech", "Umbrella", "Hooli", "Stark Industries", "Wayne Enterprises"]
+CITIES = ["San Francisco, CA", "Los Angeles, CA", "San Diego, CA", "San Jose, CA", "Oakland, CA"]
+SKILLS = ["python", "sql", "pandas", "spark", "pytorch", "tensorflow", "statistics", "a/b testing", "airflow", "dbt", "aws", "docker", "kubernetes", "tableau", "causal inference", "nlp", "computer vision", "forecasting"]
+BOILERPLATE = [
+    "{company} is an equal opportunity employer. All qualified applicants will receive consideration for employment without regard to race, color, religion, sex, sexual orientation, gender identity, national origin, disability, or veteran status.",
+    "About {company}: we are building the future of work with a team of passionate people across the globe. Our mission is to help every customer succeed.",
+    "Benefits include medical, dental and vision insurance, a 401(k) plan with company match, flexible paid time off and a generous parental leave policy.",
+]
+
+SEARCH_PAGE = """<!DOCTYPE html>
+<html><head><title>Jobs</title>
+<style>
+  div.jobs-search-results-list {{ height: 600px; overflow-y: auto; }}
+  li[data-occludable-job-id] {{ height: 120px; }}
+</style></head>
+<body>
+<div class="jobs-search-results-list"><ul class="scaffold-layout__list-container"></ul></div>
+<script>
+  const jobs = {jobs};
+  const batchSize = {batch_size};
+  const renderDelay = {render_delay};
+  const list = document.querySelector('ul.scaffold-layout__list-container');
+  const container = document.querySelector('div.jobs-search-results-list');
+  let rendered = 0;
+  let rendering = false;
+  function renderBatch() {{
+    for (const job of jobs.slice(rendered, rendered + batchSize)) {{
+      const item = document.createElement('li');
+      item.setAttribute('data-occludable-job-id', job.id);
+      item.innerHTML = job.html;
+      list.appendChild(item);
+    }}
+    rendered = Math.min(rendered + batchSize, jobs.length);
+    rendering = false;
+  }}
+  renderBatch();
+  container.addEventListener('scroll', () => {{
+    if (rendering || rendered >= jobs.length) return;
+    if (container.scrollTop + container.clientHeight >= container.scrollHeight - 200) {{
+      rendering = true;
+      setTimeout(renderBatch, renderDelay);
+    }}
+  }});
+</script>
+</body></html>
+"""
+
+CARD = """<div class="job-card-container">
+  <a class="job-card-container__link" href="{url}"><strong>{title}</strong></a>
+  <div class="artdeco-entity-lockup__subtitle">{company}</div>
+  <ul>
+    <li class="job-card-container__metadata-item">{city}</li>
+    <li class="job-card-container__metadata-item">{salary}</li>
+  </ul>
+</div>"""
+
+JOB_PAGE = """<!DOCTYPE html>
+<html><head><title>{title} - {company}</title></head>
+<body>
+<section class="top-card-layout">
+  <h1 class="top-card-layout__title">{title}</h1>
+  <a class="topcard__org-name-link">{company}</a>
+  <span class="topcard__flavor--bullet">{city}</span>
+  <span class="posted-time-ago__text">{posted} days ago</span>
+  <span class="num-applicants__caption">{applicants} applicants</span>
+</section>
+<div class="description__text">
+  <div class="show-more-less-html__markup show-more-less-html__markup--clamp-after-5">{description}</div>
+  <button class="show-more-less-html__button--more"
+    onclick="document.querySelector('.show-more-less-html__markup').classList.remove('show-more-less-html__markup--clamp-after-5')">See more</button>
+</div>
+<ul class="description__job-criteria-list">
+  <li class="description__job-criteria-item">
+    <h3 class="description__job-criteria-subheader">Employment type</h3>
+    <span class="description__job-criteria-text">Full-time</span>
+  </li>
+  <li class="description__job-criteria-item">
+    <h3 class="description__job-criteria-subheader">Job function</h3>
+    <span class="description__job-criteria-text">Engineering and Information Technology</span>
+  </li>
+</ul>
+</body></html>
+"""
+
+
+class FakeLinkedIn:
+    # Serves `jobs` synthetic postings. A `duplicate_rate` share of them are
+    # reposts of an earlier posting with a slightly edited description.
+
+    def __init__(
+        self,
+        jobs=100,
+        page_latency=0.0,
+        render_delay=200,
+        batch_size=7,
+        duplicate_rate=0.0,
+        seed=0,
+        host="127.0.0.1",
+        port=0,
+    ):
+        self.page_latency = page_latency
+        self.render_delay = render_delay
+        self.batch_size = batch_size
+        self.requests = 0
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.url = f"http://{host}:{self.server.server_address[1]}"
+        self.jobs = self._generate(jobs, duplicate_rate, random.Random(seed))
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def _generate(self, count, duplicate_rate, rng):
+        jobs = {}
+        for i in range(count):
+            job_id = str(3800000000 + i)
+            if jobs and rng.random() < duplicate_rate:
+                original = rng.choice(list(jobs.values()))
+                job = dict(original, id=job_id)
+                job["paragraphs"] = original["paragraphs"] + ["This position was reposted."]
+            else:
+                company = rng.choice(COMPANIES)
+                skills = rng.sample(SKILLS, 6)
+                job = {
+                    "id": job_id,
+                    "title": rng.choice(TITLES),
+                    "company": company,
+                    "city": rng.choice(CITIES),
+                    "salary": f"${rng.randint(100, 160)}K/yr - ${rng.randint(170, 250)}K/yr",
+                    "posted": rng.randint(1, 30),
+                    "applicants": rng.randint(5, 500),
+                    "paragraphs": [
+                        f"We are looking for a {rng.choice(TITLES).lower()} to join the {rng.choice(['growth', 'platform', 'risk', 'search', 'ads'])} team.",
+                        "Responsibilities: " + ", ".join(f"work with {skill}" for skill in skills[:3]) + ".",
+                        "Qualifications: experience with " + ", ".join(skills) + ".",
+                        f"Preferred qualifications: a graduate degree and {rng.randint(2, 8)} years of experience.",
+                    ]
+                    + [paragraph.format(company=company) for paragraph in BOILERPLATE],
+                }
+            jobs[job_id] = job
+        return jobs
+
+    def job_url(self, job_id):
+        return f"{self.url}/jobs/view/{job_id}/"
+
+    def search_page(self):
+        cards = [
+            {
+                "id": job["id"],
+                "html": CARD.format(
+                    url=self.job_url(job["id"]),
+                    title=html.escape(job["title"]),
+                    company=html.escape(job["company"]),
+                    city=html.escape(job["city"]),
+                    salary=html.escape(job["salary"]),
+                ),
+            }
+            for job in self.jobs.values()
+        ]
+        return SEARCH_PAGE.format(
+            jobs=json.dumps(cards),
+            batch_size=self.batch_size,
+            render_delay=self.render_delay,
+        )
+
+    def job_page(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        description = "".join(f"<p>{html.escape(paragraph)}</p>" for paragraph in job["paragraphs"])
+        return JOB_PAGE.format(
+            title=html.escape(job["title"]),
+            company=html.escape(job["company"]),
+            city=html.escape(job["city"]),
+            posted=job["posted"],
+            applicants=job["applicants"],
+            description=description,
+        )
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with fake._lock:
+                    fake.requests += 1
+                if fake.page_latency:
+                    time.sleep(fake.page_latency)
+                path = urlparse(self.path).path.rstrip("/")
+                parts = path.split("/")
+                if path.startswith("/jobs/search"):
+                    body = fake.search_page()
+                elif path.startswith("/jobs/view/") and len(parts) >= 4:
+                    body = fake.job_page(parts[3].split("-")[-1])
+                elif path in ("", "/jobs"):
+                    body = "<html><body><a href='/jobs/search/'>Jobs</a></body></html>"
+                else:
+                    body = None
+                if body is None:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                data = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,162 @@
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmark.fake_linkedin import FakeLinkedIn
+from benchmark.stub_openai import StubOpenAI
+
+# Offline end-to-end benchmark: runs `search_and_collect_jobs` and the run.py
+# collection loop against a local fake LinkedIn and a stub OpenAI server.
+#
+#   python -m benchmark.run_benchmark --jobs 50 --workers 4 --openai-latency 0.5
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Offline end-to-end benchmark of the scraping pipeline"
+    )
+    parser.add_argument("--jobs", type=int, default=50, help="number of synthetic job postings")
+    parser.add_argument("--workers", type=int, default=4, help="browser workers (MAX_WORKERS)")
+    parser.add_argument("--page-latency", type=float, default=0.2, help="seconds per fake LinkedIn response")
+    parser.add_argument("--render-delay", type=int, default=200, help="milliseconds to render a batch of search results")
+    parser.add_argument("--duplicate-rate", type=float, default=0.0, help="share of reposted (near duplicate) postings")
+    parser.add_argument("--openai-latency", type=float, default=0.5, help="seconds per stub completion")
+    parser.add_argument("--openai-jitter", type=float, default=0.2, help="extra random seconds per stub completion")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="answer every N-th OpenAI request with a 429")
+    parser.add_argument("--llm-mode", choices=["separate", "combined"], default="separate", help="LLM_MODE of the run")
+    parser.add_argument("--no-resume", action="store_true", help="skip the resume evaluation")
+    parser.add_argument("--browser-only", action="store_true", help="load every job page in the browser instead of over HTTP")
+    parser.add_argument("--headed", action="store_true", help="show the browser windows")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    return parser.parse_args()
+
+
+def write_resume(path):
+    import fitz
+
+    with fitz.open() as doc:
+        page = doc.new_page()
+        page.insert_text(
+            (72, 72),
+            "Data Scientist\nPython, SQL, pandas, PyTorch, statistics, A/B testing,\n"
+            "forecasting, Airflow, AWS. 6 years of experience building models.",
+        )
+        doc.save(path)
+
+
+def max_rss_mb(who):
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    rss = resource.getrusage(who).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def main():
+    args = parse_args()
+    if args.output:
+        args.output = os.path.abspath(args.output)
+    linkedin = FakeLinkedIn(
+        jobs=args.jobs,
+        page_latency=args.page_latency,
+        render_delay=args.render_delay,
+        duplicate_rate=args.duplicate_rate,
+    ).start()
+    openai = StubOpenAI(
+        latency=args.openai_latency,
+        jitter=args.openai_jitter,
+        rate_limit_every=args.rate_limit_every,
+    ).start()
+
+    # Everything the run writes goes to a scratch directory
+    workdir = tempfile.mkdtemp(prefix="linkedin-benchmark-")
+    os.chdir(workdir)
+    sys.path.insert(0, REPO_DIR)
+    os.environ.update(
+        LINKEDIN_URL=f"{linkedin.url}/jobs",
+        OPENAI_BASE_URL=f"{openai.url}/v1",
+        OPENAI_API_KEY="benchmark",
+        LOGIN_SESSION_NAME="benchmark_login_session",
+        MAX_WORKERS=str(args.workers),
+        ACCOUNT_MIN_INTERVAL="0",
+        LLM_CACHE_DISABLED="1",
+        LLM_MODE=args.llm_mode,
+    )
+    if args.browser_only:
+        os.environ["HTTP_FETCH_DISABLED"] = "1"
+    with open("benchmark_login_session.json", "w") as state_file:
+        # A login cookie that doesn't expire during the run, so no login is attempted
+        cookie = {
+            "name": "li_at",
+            "value": "benchmark",
+            "domain": "127.0.0.1",
+            "path": "/",
+            "expires": time.time() + 24 * 60 * 60,
+        }
+        json.dump({"cookies": [cookie], "origins": []}, state_file)
+    if not args.no_resume:
+        write_resume("resume.pdf")
+
+    tracemalloc.start()
+    # Imported here so that the modules pick up the environment set above
+    import run
+    from metrics import metrics, percentile
+    from search import search_and_collect_jobs
+    from settings import configure_logging
+
+    configure_logging()
+
+    headless = not args.headed
+    started = time.perf_counter()
+    with metrics.span("benchmark_search"):
+        search_and_collect_jobs("Data Scientist", "California, CA", headless=headless)
+    run.get_pool(headless).release()
+    search_seconds = time.perf_counter() - started
+
+    df = run.search_results(run.get_output(), search=False)
+    collect_started = time.perf_counter()
+    df = run.collect_job_descriptions(df, run.get_store(), max_workers=args.workers)
+    collect_seconds = time.perf_counter() - collect_started
+    run.close_clients()
+    total_seconds = time.perf_counter() - started
+    _, peak_python = tracemalloc.get_traced_memory()
+
+    job_durations = [span["duration"] for span in metrics.spans() if span["stage"] == "job"]
+    collected = int(df["job_description"].notna().sum())
+    results = {
+        "jobs_listed": args.jobs,
+        "jobs_found": len(df),
+        "jobs_collected": collected,
+        "search_seconds": search_seconds,
+        "collect_seconds": collect_seconds,
+        "total_seconds": total_seconds,
+        "jobs_per_minute": collected / collect_seconds * 60 if collect_seconds else 0.0,
+        "job_p50_seconds": percentile(job_durations, 0.5),
+        "job_p95_seconds": percentile(job_durations, 0.95),
+        "peak_python_heap_mb": peak_python / (1024 * 1024),
+        "peak_rss_mb": max_rss_mb(resource.RUSAGE_SELF),
+        "peak_children_rss_mb": max_rss_mb(resource.RUSAGE_CHILDREN),
+        "linkedin_requests": linkedin.requests,
+        "openai_requests": openai.requests,
+        "openai_rate_limited": openai.rate_limited,
+    }
+
+    print(metrics.format_report())
+    print("-" * 60)
+    for name, value in results.items():
+        print(f"{name:<24}{value:>12.2f}" if isinstance(value, float) else f"{name:<24}{value:>12}")
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+
+    linkedin.stop()
+    openai.stop()
+
+
+if __name__ == "__main__":
+    main()
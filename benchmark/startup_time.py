@@ -0,0 +1,79 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Startup time of the command line: runs each command in a fresh interpreter
+# a few times and reports the wall-clock time from launch to exit. Cheap
+# commands should stay well under --budget seconds.
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CLI = os.path.join(REPO_DIR, "cli.py")
+
+# Name -> arguments, and whether the command has to stay under the budget
+COMMANDS = {
+    "help": (["--help"], True),
+    "status": (["status"], True),
+    "search --help": (["search", "--help"], True),
+    "import run": (None, False),
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Startup time of the command line, per command")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per command")
+    parser.add_argument("--budget", type=float, default=1.0, help="seconds a cheap command may take (median)")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    return parser.parse_args()
+
+
+def time_command(arguments, workdir):
+    if arguments is None:
+        # The full import of the pipeline, for comparison
+        command = [sys.executable, "-c", f"import sys; sys.path.insert(0, {REPO_DIR!r}); import run"]
+    else:
+        command = [sys.executable, CLI] + arguments
+    started = time.perf_counter()
+    result = subprocess.run(command, cwd=workdir, capture_output=True, text=True)
+    elapsed = time.perf_counter() - started
+    error = result.stderr.strip().splitlines()[-1] if result.returncode else None
+    return elapsed, error
+
+
+def main():
+    args = parse_args()
+    if args.output:
+        args.output = os.path.abspath(args.output)
+    # `status` reads the state files of the current directory, start empty
+    workdir = tempfile.mkdtemp(prefix="linkedin-startup-")
+    results = {}
+    over_budget = []
+    for name, (arguments, cheap) in COMMANDS.items():
+        timings = []
+        error = None
+        for _ in range(args.repeat):
+            elapsed, error = time_command(arguments, workdir)
+            timings.append(elapsed)
+        median = statistics.median(timings)
+        results[name] = {"median_seconds": median, "max_seconds": max(timings), "error": error}
+        line = f"{name:<16} median {median:.3f}s  max {max(timings):.3f}s"
+        if error:
+            line += f"  (failed: {error})"
+        print(line)
+        if cheap and median > args.budget:
+            over_budget.append(name)
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+    if over_budget:
+        print(f"Over the {args.budget:.1f}s budget: {', '.join(over_budget)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# OpenAI-compatible /v1/chat/completions stub with configurable latency and
+# rate-limit responses. Replies are shaped like the ones the pipeline expects.
+
+EXTRACTION_REPLY = {
+    "Qualifications": "Experience with python and sql.",
+    "Preferred Qualifications": "Graduate degree.",
+    "Responsibilities": "Build and deploy models.",
+    "Project or job duty description": "No Information Found",
+    "Whether they offer a bonus": "No Information Found",
+    "Whether they offer equity": "No Information Found",
+    "Medical benefits": "Medical, dental and vision insurance.",
+    "Any other useful information": "No Information Found",
+}
+
+
+def evaluation_reply(rng):
+    return {
+        "evaluation_score": rng.randint(30, 95),
+        "matches": ["Python", "SQL", "Machine learning"],
+        "mismatches": ["Spark", "Kubernetes", "Causal inference"],
+    }
+
+
+class StubOpenAI:
+    # `latency` seconds per completion, plus up to `jitter` seconds; every
+    # `rate_limit_every`-th request gets a 429 with a Retry-After header
+
+    def __init__(
+        self,
+        latency=0.5,
+        jitter=0.0,
+        rate_limit_every=0,
+        retry_after=1.0,
+        seed=0,
+        host="127.0.0.1",
+        port=0,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self.requests = 0
+        self.rate_limited = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.url = f"http://{host}:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def reply(self, request):
+        prompt = " ".join(str(message.get("content", "")) for message in request["messages"])
+        with self._lock:
+            if '"extraction"' in prompt:
+                content = dict(evaluation_reply(self._rng), extraction=EXTRACTION_REPLY)
+            elif "evaluation_score" in prompt:
+                content = evaluation_reply(self._rng)
+            else:
+                content = EXTRACTION_REPLY
+        prompt_tokens = len(prompt) // 4
+        content = json.dumps(content)
+        completion_tokens = len(content) // 4
+        return {
+            "id": f"chatcmpl-{self.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "stub"),
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _send(self, status, body, headers=None):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                if not self.path.endswith("/chat/completions"):
+                    self._send(404, {"error": {"message": "Not found"}})
+                    return
+                with stub._lock:
+                    stub.requests += 1
+                    limited = stub.rate_limit_every and stub.requests % stub.rate_limit_every == 0
+                    if limited:
+                        stub.rate_limited += 1
+                    delay = stub.latency + stub._rng.uniform(0, stub.jitter)
+                if limited:
+                    self._send(
+                        429,
+                        {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+                        {"Retry-After": str(stub.retry_after)},
+                    )
+                    return
+                time.sleep(delay)
+                self._send(200, stub.reply(request))
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
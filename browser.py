@@ -0,0 +1,157 @@
+import logging
+import os
+import threading
+from contextlib import contextmanager
+
+from metrics import metrics
+from resource_filter import RESOURCE_FILTER_DISABLED, ResourceFilter
+from retry import PermanentError
+
+# Stealth mode settings
+VENDOR_INFO = "Google Inc. (Apple)"
+RENDERER_INFO = "ANGLE (Apple, Apple M1 Pro, OpenGL 4.1)"
+USER_AGENT_INFO = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36"
+
+# Number of pages a browser session serves before it is recycled
+MAX_SESSION_USES = int(os.getenv("MAX_SESSION_USES", "25"))
+
+
+def new_driver(headless=True):
+    # webql and Playwright are only loaded once a browser is needed
+    from webql.sync_api.web import PlaywrightWebDriver
+
+    driver = PlaywrightWebDriver(headless=headless)
+    # Enable stealth mode to avoid bot detection
+    driver.enable_stealth_mode(
+        webgl_vendor=VENDOR_INFO,
+        webgl_renderer=RENDERER_INFO,
+        nav_user_agent=USER_AGENT_INFO,
+    )
+    return driver
+
+
+class BrowserPool:
+    # Playwright's sync API is bound to the thread that started it, so the pool
+    # keeps one stealth-configured session per worker thread, started on its
+    # first page, and only navigates it between URLs. A session is recycled
+    # after `max_uses` pages, when a different login state is requested, or
+    # after an error.
+
+    def __init__(self, headless=True, max_uses=MAX_SESSION_USES):
+        self.headless = headless
+        self.max_uses = max_uses
+        self._local = threading.local()
+        self._states = {}
+        self._lock = threading.Lock()
+
+    def _load_state(self, storage_state_file):
+        from webql.sync_api.session import Session
+
+        if storage_state_file is None:
+            return None
+        with self._lock:
+            if storage_state_file not in self._states:
+                self._states[storage_state_file] = Session.load_user_session_state(
+                    storage_state_file
+                )
+            return self._states[storage_state_file]
+
+    def _start(self, url, storage_state_file):
+        import webql
+        from webql.sync_api import close_all_popups_handler
+
+        storage_state = self._load_state(storage_state_file)
+        # With the resource filter, open a blank page first so that the filter
+        # is in place before the first real navigation
+        start_url = url if RESOURCE_FILTER_DISABLED else "about:blank"
+        with metrics.span("driver_start"):
+            driver = new_driver(self.headless)
+        with metrics.span("start_session"):
+            if storage_state is None:
+                session = webql.start_session(start_url, web_driver=driver)
+            else:
+                session = webql.start_session(
+                    start_url, web_driver=driver, storage_state=storage_state
+                )
+        session.on("popup", close_all_popups_handler)
+        self._local.resource_filter = None
+        if not RESOURCE_FILTER_DISABLED:
+            self._local.resource_filter = ResourceFilter()
+            self._local.resource_filter.install(session.current_page.context)
+            with metrics.span("navigate"):
+                session.current_page.goto(url)
+        self._local.session = session
+        self._local.uses = 0
+        self._local.storage_state_file = storage_state_file
+        self._local.storage_state = storage_state
+        logging.info(f"Started a new browser session on {threading.current_thread().name}")
+        return session
+
+    @contextmanager
+    def session(self, url, storage_state_file=None):
+        session = getattr(self._local, "session", None)
+        if session is not None and (
+            self._local.uses >= self.max_uses
+            or self._local.storage_state_file != storage_state_file
+            # The state file was refreshed since the session started
+            or self._local.storage_state is not self._load_state(storage_state_file)
+        ):
+            self.release()
+            session = None
+        if session is None:
+            session = self._start(url, storage_state_file)
+        else:
+            with metrics.span("navigate"):
+                session.current_page.goto(url)
+        self._local.uses += 1
+        try:
+            yield session
+        except PermanentError:
+            # The posting can't be read, the page itself is fine
+            raise
+        except Exception:
+            # Don't hand out a page left in an unknown state
+            self.release()
+            raise
+
+    def take_filter_stats(self):
+        # Requests blocked by the calling thread's session since the last call
+        resource_filter = getattr(self._local, "resource_filter", None)
+        if resource_filter is None:
+            return {}
+        return resource_filter.take_stats()
+
+    def invalidate(self, storage_state_file):
+        # Forget a cached login state, e.g. after it was refreshed on disk
+        with self._lock:
+            self._states.pop(storage_state_file, None)
+
+    def release(self):
+        # Stop the calling thread's session, if any
+        session = getattr(self._local, "session", None)
+        self._local.session = None
+        if session is not None:
+            try:
+                session.stop()
+            except Exception as e:
+                logging.error(f"Error while stopping the browser session: {e}")
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(headless=True):
+    with _pools_lock:
+        if headless not in _pools:
+            _pools[headless] = BrowserPool(headless=headless)
+        return _pools[headless]
+
+
+def invalidate_state(storage_state_file):
+    # Makes every pool reload `storage_state_file` and restart the browsers
+    # that use an older copy of it
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.invalidate(storage_state_file)
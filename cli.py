@@ -0,0 +1,105 @@
+import argparse
+import os
+import sys
+
+# Loads .env before any other module of the scraper reads its settings.
+# Everything else is imported by the subcommand that needs it, so cheap
+# commands don't pay for Playwright, OpenAI, PyMuPDF or pandas.
+from settings import CSV_FILE, LOCATION_KEYWORD, SEARCH_KEYWORD, configure_logging
+
+
+def add_mode_arguments(parser):
+    parser.add_argument(
+        "--mode",
+        choices=["local", "coordinator", "worker"],
+        default="local",
+        help="local: collect on this machine; coordinator: queue the postings for "
+        "workers and write their results; worker: collect queued postings",
+    )
+    parser.add_argument("--worker-id", help="name of this worker in the work queue (default: host-pid)")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Search LinkedIn jobs and evaluate them against your resume")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    search = commands.add_parser("search", help="search LinkedIn and add the jobs to today's CSV")
+    search.add_argument(
+        "--query",
+        nargs=2,
+        action="append",
+        metavar=("KEYWORD", "LOCATION"),
+        help="search this job title in this location, can be repeated "
+        "(default: the queries file or SEARCH_KEYWORD / LOCATION_KEYWORD in settings.py)",
+    )
+    search.add_argument("--headed", action="store_true", help="show the browser windows")
+
+    describe = commands.add_parser("describe", help="collect the descriptions of today's jobs")
+    add_mode_arguments(describe)
+    evaluate = commands.add_parser(
+        "evaluate", help="collect the descriptions of today's jobs and evaluate your resume against them"
+    )
+    add_mode_arguments(evaluate)
+    run = commands.add_parser("run", help="search unless done today, then evaluate, like run.py")
+    add_mode_arguments(run)
+
+    commands.add_parser("status", help="show the progress of the job postings and the work queue")
+    return parser.parse_args(argv)
+
+
+def search(args):
+    from browser import get_pool
+    from metrics import metrics
+    from search import load_queries, search_and_collect_jobs_batch
+
+    if args.query:
+        queries = [tuple(query) for query in args.query]
+    else:
+        queries = load_queries([(SEARCH_KEYWORD, LOCATION_KEYWORD)])
+    headless = not args.headed
+    search_and_collect_jobs_batch(queries, headless)
+    get_pool(headless).release()
+    print(metrics.format_report())
+    return 0
+
+
+def collect(args, evaluate=True, search=False):
+    import run
+
+    return 0 if run.run_pipeline(args.mode, args.worker_id, evaluate=evaluate, search=search) else 1
+
+
+def status(args):
+    from job_store import JOB_STATE_DB, JobStore
+    from work_queue import WORK_QUEUE_BACKEND, WORK_QUEUE_DB, get_work_queue
+
+    print(f"Today's search results: {CSV_FILE}" + ("" if os.path.exists(CSV_FILE) else " (not searched yet)"))
+    if os.path.exists(JOB_STATE_DB):
+        store = JobStore()
+        print(f"Job states: {store.counts()}")
+        failures = store.failure_counts()
+        if failures:
+            print(f"Given up: {failures}")
+    else:
+        print(f"No job state yet ({JOB_STATE_DB})")
+    if WORK_QUEUE_BACKEND != "sqlite" or os.path.exists(WORK_QUEUE_DB):
+        print(f"Work queue: {get_work_queue().counts()}")
+    return 0
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == "status":
+        return status(args)
+    configure_logging()
+    if args.command == "search":
+        return search(args)
+    if args.command == "describe":
+        return collect(args, evaluate=False)
+    if args.command == "evaluate":
+        return collect(args)
+    return collect(args, search=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,167 @@
+import logging
+import threading
+
+# Plain DOM selectors for the fields we otherwise ask webql for. Every field
+# lists the selectors of the logged out page first, then the logged in one.
+JOB_CARDS_JS = """
+([resultsSelector]) => {
+    const text = (root, selectors) => {
+        for (const selector of selectors) {
+            const element = root.querySelector(selector);
+            if (element && element.innerText.trim()) return element.innerText.trim();
+        }
+        return null;
+    };
+    const root = document.querySelector(resultsSelector) || document;
+    const cards = Array.from(root.querySelectorAll('li[data-occludable-job-id], li .job-card-container, ul.jobs-search__results-list > li'));
+    const seen = new Set();
+    const jobs = [];
+    for (const card of cards) {
+        const link = card.querySelector('a[href*="/jobs/view/"]');
+        if (!link || seen.has(link.getAttribute('href'))) continue;
+        seen.add(link.getAttribute('href'));
+        const metadata = Array.from(card.querySelectorAll('.job-card-container__metadata-item, .job-search-card__salary-info, .artdeco-entity-lockup__metadata li'))
+            .map(element => element.innerText.trim());
+        jobs.push({
+            job_title: text(card, ['.base-search-card__title', '.job-card-list__title', '.job-card-container__link strong', '.artdeco-entity-lockup__title']),
+            company_name: text(card, ['.base-search-card__subtitle', '.job-card-container__primary-description', '.artdeco-entity-lockup__subtitle']),
+            city: text(card, ['.job-search-card__location', '.job-card-container__metadata-item', '.artdeco-entity-lockup__caption']),
+            salary_range: metadata.find(item => item.includes('$')) || null,
+            job_url: link.getAttribute('href'),
+        });
+    }
+    return jobs;
+}
+"""
+
+# Job detail field -> selectors, shared with the HTTP parser in http_fetch.py
+JOB_DETAIL_SELECTORS = {
+    "job_title": [".top-card-layout__title", ".topcard__title", ".job-details-jobs-unified-top-card__job-title"],
+    "company_name": [".topcard__org-name-link", ".topcard__flavor", ".job-details-jobs-unified-top-card__company-name"],
+    "location": [".topcard__flavor--bullet", ".job-details-jobs-unified-top-card__bullet"],
+    "posted_how_long_ago": [".posted-time-ago__text", ".job-details-jobs-unified-top-card__posted-date"],
+    "number_of_applicants": [".num-applicants__caption", ".job-details-jobs-unified-top-card__applicant-count"],
+}
+CRITERIA_ITEM = ".description__job-criteria-item"
+CRITERIA_NAME = ".description__job-criteria-subheader"
+CRITERIA_VALUE = ".description__job-criteria-text"
+# Job criteria name on the page -> field
+CRITERIA_FIELDS = {"employment type": "employment_type", "job function": "job_function"}
+
+JOB_DETAIL_JS = """
+([fieldSelectors, criteriaSelectors, criteriaFields]) => {
+    const text = (selectors) => {
+        for (const selector of selectors) {
+            const element = document.querySelector(selector);
+            if (element && element.innerText.trim()) return element.innerText.trim();
+        }
+        return null;
+    };
+    const data = {};
+    for (const [field, selectors] of Object.entries(fieldSelectors)) {
+        data[field] = text(selectors);
+    }
+    const [itemSelector, nameSelector, valueSelector] = criteriaSelectors;
+    for (const field of Object.values(criteriaFields)) data[field] = null;
+    for (const item of document.querySelectorAll(itemSelector)) {
+        const name = item.querySelector(nameSelector);
+        const value = item.querySelector(valueSelector);
+        const field = name ? criteriaFields[name.innerText.trim().toLowerCase()] : undefined;
+        if (field && value) data[field] = value.innerText.trim();
+    }
+    return data;
+}
+"""
+
+EXPAND_DESCRIPTION_JS = """
+() => {
+    const button = document.querySelector('button.show-more-less-html__button--more, button.jobs-description__footer-button');
+    if (!button) return false;
+    button.click();
+    return true;
+}
+"""
+
+
+class ExtractionStats:
+    # Counts how often the selectors worked and how often webql had to be used
+
+    def __init__(self):
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def record(self, kind, fallback):
+        with self._lock:
+            counts = self._counts.setdefault(kind, {"selector": 0, "fallback": 0})
+            counts["fallback" if fallback else "selector"] += 1
+
+    def fallback_rate(self, kind):
+        with self._lock:
+            counts = self._counts.get(kind, {"selector": 0, "fallback": 0})
+            total = counts["selector"] + counts["fallback"]
+            return counts["fallback"] / total if total else 0.0
+
+    def report(self):
+        with self._lock:
+            kinds = list(self._counts)
+        return {
+            kind: dict(self._counts[kind], fallback_rate=self.fallback_rate(kind))
+            for kind in kinds
+        }
+
+    def log_stats(self):
+        for kind, counts in self.report().items():
+            message = (
+                f"Selector extraction '{kind}': {counts['selector']} selector hits, "
+                f"{counts['fallback']} webql fallbacks ({counts['fallback_rate']:.0%})"
+            )
+            if counts["fallback_rate"] > 0.5:
+                logging.warning(f"{message}. The selectors may be out of date.")
+            else:
+                logging.info(message)
+
+
+extraction_stats = ExtractionStats()
+
+
+def extract_job_cards(page, results_selector):
+    # Returns the rendered job cards, or [] if the selectors found none
+    try:
+        jobs = page.evaluate(JOB_CARDS_JS, [results_selector])
+    except Exception as e:
+        logging.error(f"Job card selectors failed: {e}")
+        jobs = []
+    jobs = [job for job in jobs if job.get("job_title")]
+    extraction_stats.record("job_cards", fallback=not jobs)
+    return jobs
+
+
+def extract_job_detail(page):
+    # Returns the job detail fields, or {} if the selectors missed the title
+    try:
+        data = page.evaluate(
+            JOB_DETAIL_JS,
+            [
+                JOB_DETAIL_SELECTORS,
+                [CRITERIA_ITEM, CRITERIA_NAME, CRITERIA_VALUE],
+                CRITERIA_FIELDS,
+            ],
+        )
+    except Exception as e:
+        logging.error(f"Job detail selectors failed: {e}")
+        data = {}
+    if not data.get("job_title"):
+        data = {}
+    extraction_stats.record("job_detail", fallback=not data)
+    return data
+
+
+def expand_description(page):
+    # Clicks the "See more" button, returns False if it wasn't found
+    try:
+        clicked = page.evaluate(EXPAND_DESCRIPTION_JS)
+    except Exception as e:
+        logging.error(f"'See more' selector failed: {e}")
+        clicked = False
+    extraction_stats.record("see_more", fallback=not clicked)
+    return clicked
@@ -1,40 +1,33 @@
 import logging
 import os
-import time
 import json
-from datetime import datetime
-
-import fitz
-import webql
-from dotenv import load_dotenv
-from openai import OpenAI
-from webql.sync_api import close_all_popups_handler
-from webql.sync_api.session import Session
-from webql.sync_api.web import PlaywrightWebDriver
-
-from login import *
-
-load_dotenv()
-
-# Configure logging
-today = datetime.today().strftime("%Y_%m_%d")
-log_filename = f"job_description_logs_{today}.log"
-logging.basicConfig(
-    filename=log_filename,
-    filemode="w",
-    level=logging.INFO,
-    format="%(asctime)s:%(levelname)s:%(message)s",
-)
+import re
 
-CSV_FILE = f"jobs_postings_{today}.csv"
+# Loads .env before the modules below read their settings
+import settings
 
+from browser import get_pool
+from dom_extract import expand_description, extract_job_detail
+from llm import get_stage
+from llm_cache import acached_completion
+from llm_output import (
+    EXTRACTION_FIELDS,
+    MAX_POINTS,
+    is_valid,
+    load_json_reply,
+    normalize_evaluation,
+    normalize_extraction,
+)
+from metrics import metrics, timed_query
+from readiness import wait_for_selector
+from retry import PermanentError
+from sessions import get_session_manager
 
-def extract_text_from_pdf(pdf_path):
-    with fitz.open(pdf_path) as doc:
-        text = ""
-        for page in doc:
-            text += page.get_text()
-    return text
+DESCRIPTION_SELECTOR = ".description__text"
+# The description markup loses its clamp class once "See more" was clicked
+EXPANDED_DESCRIPTION_SELECTOR = ".show-more-less-html__markup:not(.show-more-less-html__markup--clamp-after-5)"
+LOGIN_WALL_URL = re.compile(r"/(authwall|login|signup|checkpoint)\b")
+EXPIRED_POSTING = re.compile(r"no longer available|this job (has expired|is closed)", re.IGNORECASE)
 
 
 def get_job_description_text(session):
@@ -49,9 +42,9 @@ def get_job_description_text(session):
     )  # This should return the text from the containers
 
 
-def process_job_description(job_description, max_retry=3):
-    client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
-    prompt = f"""Please extract the following details from the job description provided. If information about a specific item is not found, return 'No Information Found'.
+JOB_DESCRIPTION_MODEL = "gpt-3.5-turbo"
+JOB_DESCRIPTION_SYSTEM_PROMPT = "You are an expert data science and machine learning expert. Your task is to extract information from job descriptions based on the user instructions."
+JOB_DESCRIPTION_PROMPT = """Please extract the following details from the job description provided. If information about a specific item is not found, return 'No Information Found'.
 
     Job Description:
     {job_description}
@@ -67,23 +60,12 @@ def process_job_description(job_description, max_retry=3):
     
     Return the extracted information in the JSON format where the keys are the items listed above and the values are the extracted information.
     """
-    completion = client.chat.completions.create(
-        messages=[
-            {
-                "role": "system",
-                "content": "You are an expert data science and machine learning expert. Your task is to extract information from job descriptions based on the user instructions.",
-            },
-            {"role": "user", "content": prompt},
-        ],
-        model="gpt-3.5-turbo",
-    )
 
-    return completion.choices[0].message.content
-
-
-def evaluate_resume(resume_str, job_description_str, job_title):
-    client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
-    prompt = f"""Please evaluate the resume based on the job description and the job title provided. \
+EVALUATION_MODEL = "gpt-4-turbo-preview"
+EVALUATION_SYSTEM_PROMPT = """You are an expert in human resources. \
+                Your task is to evaluate a resume based on the job description provided. \
+                Follow the user instructions to complete the task."""
+EVALUATION_PROMPT = """Please evaluate the resume based on the job description and the job title provided. \
     Provide a final evaluation score between 0 and 100 where 0 indicates no match and 100 indicates a perfect match. \
     Also, provide a brief explanation of the evaluation score and highlight the key areas in terms of matches and mismatches. \
     Job Description: \
@@ -96,179 +78,251 @@ def evaluate_resume(resume_str, job_description_str, job_title):
     Return the evaluation score and the short explanation in the JSON format where the keys are 'evaluation_score', 'matches' and 'mismatches'. \
     Make sure your explanations are brief and bullet-pointed. Limit the bullet points to 3 for both matches and mismatches.
     """
-    completion = client.chat.completions.create(
-        model="gpt-4-turbo-preview",
-        messages=[
-            {
-                "role": "system",
-                "content": """You are an expert in human resources. \
-                Your task is to evaluate a resume based on the job description provided. \
-                Follow the user instructions to complete the task.""",
-            },
-            {"role": "user", "content": prompt},
-        ],
+
+# "separate" extracts with JOB_DESCRIPTION_MODEL, then evaluates the
+# extraction with EVALUATION_MODEL. "combined" does both in one JSON mode
+# call to COMBINED_MODEL with the resume as a fixed prefix.
+LLM_MODE = os.getenv("LLM_MODE", "separate")
+COMBINED_MODEL = os.getenv("COMBINED_MODEL", EVALUATION_MODEL)
+COMBINED_SCHEMA = json.dumps(
+    {
+        "extraction": {field: "..." for field in EXTRACTION_FIELDS},
+        "evaluation_score": "integer between 0 and 100",
+        "matches": [f"at most {MAX_POINTS} brief bullet points"],
+        "mismatches": [f"at most {MAX_POINTS} brief bullet points"],
+    },
+    indent=4,
+)
+# The resume comes first so the prefix is identical for every job posting
+COMBINED_SYSTEM_PROMPT = """You are an expert in human resources and in data science and machine learning hiring. \
+    For every job posting the user sends, extract its details and evaluate the resume below against it.
+
+    Resume:
+    {resume_str}
+
+    Reply with one JSON object of this shape:
+    {schema}
+
+    In "extraction", use 'No Information Found' for the items the job description doesn't mention. \
+    The evaluation score is between 0 and 100 where 0 indicates no match and 100 indicates a perfect match. \
+    Keep the matches and the mismatches brief.
+    """
+COMBINED_PROMPT = """Job Title:
+    {job_title}
+
+    Job Description:
+    {job_description}
+    """
+
+
+def job_description_messages(job_description):
+    return [
+        {"role": "system", "content": JOB_DESCRIPTION_SYSTEM_PROMPT},
+        {
+            "role": "user",
+            "content": JOB_DESCRIPTION_PROMPT.format(job_description=job_description),
+        },
+    ]
+
+
+def evaluation_messages(resume_str, job_description_str, job_title):
+    return [
+        {"role": "system", "content": EVALUATION_SYSTEM_PROMPT},
+        {
+            "role": "user",
+            "content": EVALUATION_PROMPT.format(
+                job_description_str=job_description_str,
+                resume_str=resume_str,
+                job_title=job_title,
+            ),
+        },
+    ]
+
+
+def combined_messages(resume_str, job_description, job_title):
+    return [
+        {
+            "role": "system",
+            "content": COMBINED_SYSTEM_PROMPT.format(
+                resume_str=resume_str, schema=COMBINED_SCHEMA
+            ),
+        },
+        {
+            "role": "user",
+            "content": COMBINED_PROMPT.format(
+                job_title=job_title, job_description=job_description
+            ),
+        },
+    ]
+
+
+async def aprocess_job_description(job_description):
+    with metrics.span("process_job_description"):
+        return await acached_completion(
+            JOB_DESCRIPTION_MODEL,
+            JOB_DESCRIPTION_SYSTEM_PROMPT + JOB_DESCRIPTION_PROMPT,
+            (job_description,),
+            lambda: get_stage().chat(
+                JOB_DESCRIPTION_MODEL, job_description_messages(job_description)
+            ),
+        )
+
+
+async def aevaluate_resume(resume_str, job_description_str, job_title):
+    with metrics.span("evaluate_resume"):
+        return await acached_completion(
+            EVALUATION_MODEL,
+            EVALUATION_SYSTEM_PROMPT + EVALUATION_PROMPT,
+            (job_description_str, resume_str, job_title),
+            lambda: get_stage().chat(
+                EVALUATION_MODEL,
+                evaluation_messages(resume_str, job_description_str, job_title),
+            ),
+            valid=lambda reply: is_valid(parse_evaluation, reply),
+        )
+
+
+async def aextract_and_evaluate(resume_str, job_description, job_title):
+    with metrics.span("extract_and_evaluate"):
+        return await acached_completion(
+            COMBINED_MODEL,
+            COMBINED_SYSTEM_PROMPT + COMBINED_PROMPT,
+            (resume_str, job_description, job_title),
+            lambda: get_stage().chat(
+                COMBINED_MODEL,
+                combined_messages(resume_str, job_description, job_title),
+                response_format={"type": "json_object"},
+            ),
+            valid=lambda reply: is_valid(parse_combined, reply),
+        )
+
+
+def process_job_description(job_description, max_retry=3):
+    return get_stage().run(aprocess_job_description(job_description))
+
+
+def evaluate_resume(resume_str, job_description_str, job_title):
+    return get_stage().run(
+        aevaluate_resume(resume_str, job_description_str, job_title)
     )
-    return completion.choices[0].message.content
 
 
-def collect_job_description(url, login_first=False, max_retry=3, headless=True):
-    # Stealth mode settings
-    vendor_info = "Google Inc. (Apple)"
-    renderer_info = "ANGLE (Apple, Apple M1 Pro, OpenGL 4.1)"
-    user_agent_info = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36"
-    session_name = os.getenv("JOB_DESC_SESSION_NAME")
-    # Login
+def parse_evaluation(evaluation):
+    return normalize_evaluation(load_json_reply(evaluation))
+
+
+def parse_combined(reply):
+    # Returns the extraction as JSON text, like the separate extraction
+    # reply, and the evaluation
+    data = load_json_reply(reply)
+    extraction = data.get("extraction")
+    if not isinstance(extraction, dict):
+        # Some replies flatten the extraction into the top level object
+        extraction = data
+    return json.dumps(normalize_extraction(extraction), indent=4), normalize_evaluation(data)
+
+
+def collect_job_description(url):
+    # One posting through run.py's stages, with the job store, the near
+    # duplicates, the LLM cache and the retries. Returns its page data with
+    # the extraction and evaluation, or {} if it failed.
+    import run
+
+    return run.collect_posting(url)
+
+
+def check_job_page(page):
+    # Raises PermanentError if the posting can't be read by retrying
+    if LOGIN_WALL_URL.search(page.url):
+        raise PermanentError(f"LinkedIn showed the login wall instead of {page.url}")
+    if "/jobs/view/" not in page.url:
+        raise PermanentError(f"The posting redirected to {page.url}")
+    text = page.evaluate("() => document.body ? document.body.innerText : ''")
+    if EXPIRED_POSTING.search(text):
+        raise PermanentError("The posting is no longer available")
+
+
+def scrape_job_description(url, login_first=False, headless=True):
+    # Browser stage: one attempt at the posting's fields with the raw
+    # description text under "raw_description". Raises on failure; callers
+    # retry through a RetryPolicy.
+    pool = get_pool(headless)
+    account = None
+    storage_state_file = None
+    # Login, only if the account's saved login state is missing or expired
     if login_first:
+        manager = get_session_manager()
+        account = manager.account()
         try:
-            # Login
-            if os.path.exists(f"{session_name}.json"):
-                login_session_state = Session.load_user_session_state(
-                    f"{session_name}.json"
-                )
-            else:
-                driver = PlaywrightWebDriver(headless=headless)
-                driver.enable_stealth_mode(
-                    webgl_vendor=vendor_info,
-                    webgl_renderer=renderer_info,
-                    nav_user_agent=user_agent_info,
-                )
-                email = os.getenv("EMAIL")
-                password = os.getenv("PASSWORD")
-                login_session = webql.start_session(url, web_driver=driver)
-                login(login_session, email, password, session_name)
-                login_session_state = Session.load_user_session_state(
-                    f"{session_name}.json"
-                )
-            # Given the login session state, start a new session
-            driver = PlaywrightWebDriver(headless=headless)
-            # Enable stealth mode to avoid bot detection
-            driver.enable_stealth_mode(
-                webgl_vendor=vendor_info,
-                webgl_renderer=renderer_info,
-                nav_user_agent=user_agent_info,
-            )
-            session = webql.start_session(
-                url, web_driver=driver, storage_state=login_session_state
-            )
-        except AttributeError as e:
+            storage_state_file = manager.storage_state(url, account, headless)
+        except Exception as e:
             logging.error(
-                "Login was not successful ...\nLaunching the session without login ...\n"
+                f"Login was not successful ({e}) ...\nLaunching the session without login ...\n"
             )
-            driver = PlaywrightWebDriver(headless=headless)
-            driver.enable_stealth_mode(
-                webgl_vendor=vendor_info,
-                webgl_renderer=renderer_info,
-                nav_user_agent=user_agent_info,
-            )
-            session = webql.start_session(url, web_driver=driver)
-    else:
-        driver = PlaywrightWebDriver(headless=headless)
-        driver.enable_stealth_mode(
-            webgl_vendor=vendor_info,
-            webgl_renderer=renderer_info,
-            nav_user_agent=user_agent_info,
-        )
-        session = webql.start_session(url, web_driver=driver)
-        try:
-            resume_str = extract_text_from_pdf("resume.pdf")
-            logging.info(f"Resume Reading Successful:\n\n {resume_str[:100]}")
-        except Exception as e:
-            logging.error(f"Resume Reading Error: {e}")
-            resume_str = ""
-        for i in range(max_retry):
+        manager.pace(account)
+
+    with pool.session(url, storage_state_file=storage_state_file) as session:
+        if not wait_for_selector(session.current_page, DESCRIPTION_SELECTOR):
             try:
-                logging.info(f"Attempt {i + 1}/{max_retry}")
-                # Expand the job description
-                response = session.query("""{ see_more }""")
-                logging.info("Clicking on the 'See more' button")
-                session.on("popup", close_all_popups_handler)
-                time.sleep(5)
-                response.see_more.click(force=True)
-                time.sleep(5)
-
-                # Get the job description
-                # Job description is different for logged in and logged out users
-                if login_first:
-                    # TODO: The query for the logged in user is not working, don't use it.
-                    QUERY = """
-                    {
-                        job_title
-                        company_name
-                        location
-                        posted_how_long_ago
-                        number_of_applicants
-                        required_skills_identified_by_linkedin
-                        show_all_skills
-                        text_description
-                    }
-                    """
-                else:
-                    QUERY = """
-                    {
-                        job_title
-                        company_name
-                        location
-                        posted_how_long_ago
-                        number_of_applicants
-                        text_description
-                        employment_type
-                        job_function
-                    }
-                    """
-                logging.info("Getting the job description")
-                response = session.query(QUERY)
-                time.sleep(5)
-                data = response.to_data()
-                logging.info(f"Data:\n\n {data}")
-                # Sometimes page doesn't load up correctly.
-                # Retry to ensure the job description is collected
-                # If the job title is None, then retry
-                if data.get("job_title", "") is not None:
-                    # text_desc = data.get("text_description", "")
-                    # logging.info(f"Text Description:\n\n{text_desc}")
-                    text_desc = get_job_description_text(session)
-                    logging.info(f"Job Description from LinkedIn:\n\n{text_desc}")
-                    # Get specific details from the job description
-                    job_description = process_job_description(str(text_desc))
-                    logging.info(f"Job Description from chatgpt:\n\n{job_description}")
-                    # Get specific details from the job description
-                    data["text_description"] = job_description
-                    # Evaluate the resume
-                    if resume_str:
-                        evaluation = evaluate_resume(
-                            resume_str, job_description, data.get("job_title", "")
-                        )
-                        logging.info(f"Resume Evaluation:\n\n{evaluation}")
-                        evaluation = evaluation.replace("```", "")
-                        evaluation = evaluation.replace("json", "")
-                        evals = json.loads(evaluation)
-                        print(f"Evals score: {evals['evaluation_score']}")
-                        data["evaluation_score"] = evals["evaluation_score"]
-                        data["matches"] = evals["matches"]
-                        data["mismatches"] = evals["mismatches"]
-                    else:
-                        logging.info("No resume provided for evaluation")
-                        data["evaluation_score"] = "No resume provided for evaluation"
-                        data["matches"] = "No resume provided for evaluation"
-                        data["mismatches"] = "No resume provided for evaluation"
-                    logging.info(f"Data:\n\n {data}")
-                    session.stop()
-                    return data
-                elif i < max_retry - 1:
-                    logging.info("Retrying to get the job description")
-                else:
-                    logging.error("Failed to get the job description")
-                    session.stop()
-                    return {}
-            except Exception as e:
-                logging.error(f"Error: {e}")
-                if i < max_retry - 1:
-                    logging.info("Retrying to get the job description")
-                    continue
-                else:
-                    logging.error("Failed to get the job description")
-                    session.stop()
-                    return {}
+                check_job_page(session.current_page)
+            except PermanentError:
+                if storage_state_file is None or not LOGIN_WALL_URL.search(session.current_page.url):
+                    raise
+                # LinkedIn rejected the saved login, the retry logs in again
+                manager.expire(account)
+                raise RuntimeError(f"The login state of {account} was rejected")
+            raise TimeoutError("The job description did not load")
+        # Expand the job description
+        logging.info("Clicking on the 'See more' button")
+        if not expand_description(session.current_page):
+            response = timed_query(session, """{ see_more }""", "see_more")
+            response.see_more.click(force=True)
+        wait_for_selector(session.current_page, EXPANDED_DESCRIPTION_SELECTOR, timeout=5)
+
+        # Get the job description
+        # Read the fields with plain selectors, ask webql only if they found nothing
+        logging.info("Getting the job description")
+        data = extract_job_detail(session.current_page)
+        if not data:
+            # Job description is different for logged in and logged out users
+            if storage_state_file:
+                # TODO: The query for the logged in user is not working, don't use it.
+                QUERY = """
+                {
+                    job_title
+                    company_name
+                    location
+                    posted_how_long_ago
+                    number_of_applicants
+                    required_skills_identified_by_linkedin
+                    show_all_skills
+                    text_description
+                }
+                """
+            else:
+                QUERY = """
+                {
+                    job_title
+                    company_name
+                    location
+                    posted_how_long_ago
+                    number_of_applicants
+                    text_description
+                    employment_type
+                    job_function
+                }
+                """
+            response = timed_query(session, QUERY, "job_detail")
+            data = response.to_data()
+        logging.info(f"Data:\n\n {data}")
+        # Sometimes page doesn't load up correctly, the retry loads it again
+        if data.get("job_title") is None:
+            raise ValueError("The job title is missing, the page didn't load correctly")
+        with metrics.span("get_job_description_text"):
+            text_desc = get_job_description_text(session)
+        logging.info(f"Job Description from LinkedIn:\n\n{text_desc}")
+        data["raw_description"] = text_desc
+        return data
 
 
 # url = "www.linkedin.com/jobs/view/3827219715/?eBP=CwEAAAGOPvvLHUV5eEv5-LYp7h9SJqa1c_exttkIgVPMJ1OGc3aQ_fyoUnwFdXgr4aM59M3RsckdzvJyhS2sav6n_9HxK8mmqoF_aXvTMdl7-PCEjeUp4a5msVqH37CiMW2DT4aHsfXPUxE_pCELMpaLW-lbkfHehWbRRgOS9gH21kJgqk7fsxZPnxbBSiPDHoocD5PquGxG0dW81mIpu8iybJS0bFtyZXeJzQKk4fcNPR0OyPVJrxBN1aTeHNJZLTLvzwGqHzSBsG_Ve5ouvwKX3BsfeCy8CjcvR-3vW1bVH0bgwz7vLOgDdHKfKDwCb39qHQqXJLmdpEuPrpDE3-Vm89gQyeQWOArHjEwNkOgG4ozDc8de-pl5yShYQjCO4FgGEvQQLeqc08nY9G1A0r2H8LejAFAN&refId=NGdHb6XKchtZPU%2FKHYt5GQ%3D%3D&trackingId=vCjYCXlT%2FMbmgQbsw25O2A%3D%3D&trk=flagship3_search_srp_jobs"
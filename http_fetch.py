@@ -0,0 +1,191 @@
+import asyncio
+import logging
+import os
+import threading
+
+import httpx
+from bs4 import BeautifulSoup
+
+from browser import USER_AGENT_INFO
+from dom_extract import (
+    CRITERIA_FIELDS,
+    CRITERIA_ITEM,
+    CRITERIA_NAME,
+    CRITERIA_VALUE,
+    JOB_DETAIL_SELECTORS,
+)
+from metrics import metrics
+from retry import (
+    PERMANENT,
+    TRANSIENT,
+    CircuitOpenError,
+    PermanentError,
+    classify,
+    get_breaker,
+    status_code,
+)
+
+# Set HTTP_FETCH_DISABLED=1 to load every job page in the browser
+HTTP_FETCH_DISABLED = os.getenv("HTTP_FETCH_DISABLED", "0") == "1"
+# Maximum number of job pages downloaded at once
+HTTP_CONCURRENCY = int(os.getenv("HTTP_CONCURRENCY", "16"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "20"))
+DESCRIPTION_SELECTOR = ".description__text"
+# The posting was removed, no need to try the browser
+GONE_STATUS = {404, 410}
+HEADERS = {
+    "User-Agent": USER_AGENT_INFO,
+    "Accept": "text/html,application/xhtml+xml",
+    "Accept-Language": "en-US,en;q=0.9",
+}
+
+
+def _inline_text(element):
+    return " ".join(element.get_text(" ").split())
+
+
+def _first_text(soup, selectors):
+    for selector in selectors:
+        element = soup.select_one(selector)
+        if element is not None and _inline_text(element):
+            return _inline_text(element)
+    return None
+
+
+def parse_job_page(html):
+    # Same fields as `extract_job_detail` plus "raw_description", or {} if
+    # the page has no title or description (e.g. the login wall)
+    soup = BeautifulSoup(html, "html.parser")
+    data = {field: _first_text(soup, selectors) for field, selectors in JOB_DETAIL_SELECTORS.items()}
+    data.update(dict.fromkeys(CRITERIA_FIELDS.values()))
+    for item in soup.select(CRITERIA_ITEM):
+        name = item.select_one(CRITERIA_NAME)
+        value = item.select_one(CRITERIA_VALUE)
+        field = CRITERIA_FIELDS.get(_inline_text(name).lower()) if name is not None else None
+        if field and value is not None:
+            data[field] = _inline_text(value)
+    # The logged out page ships the whole description, the "See more" button
+    # only unclamps it
+    containers = soup.select(DESCRIPTION_SELECTOR)
+    for button in (button for container in containers for button in container.select("button")):
+        button.decompose()
+    data["raw_description"] = "\n".join(container.get_text("\n", strip=True) for container in containers)
+    if not data["job_title"] or not data["raw_description"]:
+        return {}
+    return data
+
+
+def page_url(job_url):
+    # Job links from the search keep LinkedIn's host without a scheme
+    return job_url if job_url.startswith("http") else f"https://{job_url}"
+
+
+class HttpFetcher:
+    # Downloads public job pages over one pooled keep-alive client. Must be
+    # used from a single event loop, e.g. the LLM stage's.
+
+    def __init__(self, concurrency=HTTP_CONCURRENCY, timeout=HTTP_TIMEOUT):
+        self.client = httpx.AsyncClient(
+            headers=HEADERS,
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=concurrency,
+                max_keepalive_connections=concurrency,
+            ),
+            timeout=httpx.Timeout(timeout, connect=10.0),
+        )
+        # Separate from the browser's breaker: LinkedIn blocking plain HTTP
+        # clients doesn't mean that the browser is blocked too
+        self.breaker = get_breaker("linkedin_http")
+        # Queue on a semaphore rather than the pool, whose wait can time out
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self.parsed = 0
+        self.fallbacks = 0
+        self._lock = threading.Lock()
+
+    async def _get(self, job_url):
+        # Called once the breaker let the fetch through, every way out of
+        # here settles it, or a probe would keep the circuit open for good
+        settled = False
+        try:
+            async with self._semaphore:
+                with metrics.span("http_fetch") as span:
+                    try:
+                        response = await self.client.get(page_url(job_url))
+                        span["status"] = response.status_code
+                        response.raise_for_status()
+                    except httpx.HTTPError as e:
+                        settled = True
+                        if status_code(e) in GONE_STATUS:
+                            self.breaker.record_failure(PERMANENT)
+                            raise PermanentError(f"{job_url} answered {status_code(e)}") from e
+                        logging.info(f"HTTP fetch of {job_url} failed: {e}")
+                        self.breaker.record_failure(classify(e))
+                        return None
+                    except Exception as e:
+                        # E.g. httpx.InvalidURL, which is not an HTTPError
+                        settled = True
+                        logging.warning(f"HTTP fetch of {job_url} failed: {e.__class__.__name__}: {e}")
+                        self.breaker.record_failure(classify(e))
+                        return None
+                    settled = True
+                    self.breaker.record_success()
+                    try:
+                        return await asyncio.to_thread(parse_job_page, response.text)
+                    except Exception as e:
+                        logging.warning(f"Could not parse the job page of {job_url}: {e.__class__.__name__}: {e}")
+                        return None
+        finally:
+            if not settled:
+                # Cancelled while waiting for the answer
+                self.breaker.record_failure(TRANSIENT)
+
+    async def fetch(self, job_url):
+        # Returns the parsed job page, or {} so the caller can use the
+        # browser. Raises PermanentError if the posting is gone.
+        try:
+            self.breaker.before_call()
+        except CircuitOpenError:
+            data = {}
+        else:
+            data = await self._get(job_url)
+            if data == {}:
+                logging.info(f"Could not parse {job_url} without the browser")
+            data = data or {}
+        with self._lock:
+            if data:
+                self.parsed += 1
+            else:
+                self.fallbacks += 1
+        return data
+
+    def log_stats(self):
+        with self._lock:
+            logging.info(
+                f"HTTP fetch: {self.parsed} job pages parsed, "
+                f"{self.fallbacks} sent to the browser"
+            )
+
+    async def close(self):
+        await self.client.aclose()
+
+
+_fetcher = None
+_fetcher_lock = threading.Lock()
+
+
+def get_fetcher():
+    global _fetcher
+    with _fetcher_lock:
+        if _fetcher is None:
+            _fetcher = HttpFetcher()
+        return _fetcher
+
+
+def reset_fetcher():
+    # Forgets the shared fetcher and returns it, or None, so it can be closed
+    # on the loop it was used from
+    global _fetcher
+    with _fetcher_lock:
+        fetcher, _fetcher = _fetcher, None
+    return fetcher
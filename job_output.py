@@ -0,0 +1,372 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from job_store import job_id_from_url
+from metrics import metrics
+
+# Daily JSONL segments, their index and the compacted Parquet archive
+OUTPUT_DIR = os.getenv("OUTPUT_DIR", "output")
+# Records buffered before they are appended to the segment, and rows per
+# Parquet row group / CSV chunk when compacting
+OUTPUT_BATCH_SIZE = int(os.getenv("OUTPUT_BATCH_SIZE", "500"))
+# Folder of the archive, one Parquet file per day
+ARCHIVE_DIR = "parquet"
+
+# Columns merged across the records of a job instead of overwritten: the
+# queries that found it are collected, the first ID is kept
+LIST_COLUMNS = {"queries"}
+FIRST_COLUMNS = {"ID"}
+# Stored as numbers in the archive, every other column as text
+NUMERIC_COLUMNS = {"salary_min", "salary_max", "match_score"}
+# Salaries are annualized, hours and months per year
+HOURS_PER_YEAR = 2080
+MONTHS_PER_YEAR = 12
+SALARY_AMOUNT = r"\$\s?(?P<amount>\d[\d,]*(?:\.\d+)?)\s?(?P<thousands>[kK])?"
+
+
+def segment_name(day=None):
+    day = day or datetime.today()
+    return f"jobs_{day.strftime('%Y_%m_%d')}.jsonl"
+
+
+def archive_name(segment):
+    return os.path.splitext(segment)[0] + ".parquet"
+
+
+def job_key(record):
+    # LinkedIn job ID, or a hash of the card's text for a card without a link
+    link = record.get("job_link")
+    if isinstance(link, str) and link:
+        return job_id_from_url(link)
+    text = "|".join(str(record.get(column)) for column in ("job_title", "company_name", "city"))
+    return "card-" + hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def _missing(value):
+    return value is None or (isinstance(value, float) and np.isnan(value))
+
+
+def fold(records):
+    # Merges the records of one job, oldest first: later values win, except
+    # for LIST_COLUMNS and FIRST_COLUMNS
+    merged = {}
+    for record in records:
+        for column, value in record.items():
+            if _missing(value):
+                continue
+            if column in LIST_COLUMNS:
+                values = merged.setdefault(column, [])
+                values += [item for item in str(value).split("; ") if item and item not in values]
+            elif column not in FIRST_COLUMNS or column not in merged:
+                merged[column] = value
+    for column in LIST_COLUMNS & merged.keys():
+        merged[column] = "; ".join(merged[column])
+    return merged
+
+
+def clean_salaries(salary_range):
+    # Vectorized `search.clean_text`
+    return salary_range.str.replace(r"[^\w$/.()]+", ".", regex=True)
+
+
+def normalize_salaries(salary_range):
+    # Yearly salary_min / salary_max from texts like "$120K/yr - $150K/yr"
+    # or "$45/hr", NaN when there is no amount
+    salary_range = salary_range.astype("string")
+    amounts = salary_range.str.extractall(SALARY_AMOUNT)
+    bounds = pd.DataFrame(
+        {"salary_min": np.nan, "salary_max": np.nan}, index=salary_range.index
+    )
+    if amounts.empty:
+        return bounds
+    values = amounts["amount"].str.replace(",", "", regex=False).astype(float)
+    values = values.where(amounts["thousands"].isna(), values * 1000)
+    grouped = values.groupby(level=0)
+    bounds["salary_min"] = grouped.min()
+    bounds["salary_max"] = grouped.max()
+    period = np.select(
+        [
+            salary_range.str.contains(r"/\s?(?:hr|hour)", case=False, na=False),
+            salary_range.str.contains(r"/\s?(?:mo|month)", case=False, na=False),
+        ],
+        [HOURS_PER_YEAR, MONTHS_PER_YEAR],
+        default=1,
+    )
+    return bounds.mul(period, axis=0)
+
+
+def finish_batch(batch):
+    # DataFrame of folded job records with the salary columns added
+    df = pd.DataFrame(batch)
+    if "salary_range" in df:
+        df[["salary_min", "salary_max"]] = normalize_salaries(df["salary_range"])
+        df["salary_range"] = clean_salaries(df["salary_range"].astype("string"))
+    return df
+
+
+class JobOutput:
+    # Append-only job records in daily JSONL segments. An SQLite index keeps
+    # the offset of every record by job, so a job's records (search results,
+    # then its description) are merged when exporting without loading a
+    # whole segment. Records are buffered and appended in batches.
+
+    def __init__(self, directory=OUTPUT_DIR, batch_size=OUTPUT_BATCH_SIZE):
+        self.directory = directory
+        self.batch_size = batch_size
+        os.makedirs(directory, exist_ok=True)
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(directory, "index.db"), check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS records (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                job_id TEXT NOT NULL,
+                segment TEXT NOT NULL,
+                offset INTEGER NOT NULL,
+                length INTEGER NOT NULL
+            )
+            """
+        )
+        # Every column seen so far, in order, so the whole output has one schema
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS columns (seq INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT UNIQUE NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS records_job ON records (job_id, seq)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS records_segment ON records (segment, job_id)")
+        # Days written to the archive, with the number of columns they were
+        # written with, and the last record compacted
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS compacted (segment TEXT PRIMARY KEY, columns INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS compaction (id INTEGER PRIMARY KEY CHECK (id = 0), seq INTEGER)")
+        self._conn.commit()
+
+    def append(self, record, job_id=None):
+        # Buffers a record of a job, keyed by `job_id` or its link
+        job_id = job_id or job_key(record)
+        line = json.dumps(record, default=str)
+        with self._lock:
+            self._buffer.append((job_id, list(record), line))
+            if len(self._buffer) >= self.batch_size:
+                self._write(self._buffer)
+                self._buffer = []
+
+    def append_rows(self, df):
+        for record in df.to_dict("records"):
+            self.append({column: value for column, value in record.items() if not _missing(value)})
+
+    def flush(self):
+        with self._lock:
+            if self._buffer:
+                self._write(self._buffer)
+                self._buffer = []
+
+    def _write(self, entries):
+        segment = segment_name()
+        rows = []
+        with metrics.span("output_append", records=len(entries)), open(
+            os.path.join(self.directory, segment), "ab"
+        ) as segment_file:
+            offset = segment_file.tell()
+            for job_id, _, line in entries:
+                data = (line + "\n").encode("utf-8")
+                segment_file.write(data)
+                rows.append((job_id, segment, offset, len(data)))
+                offset += len(data)
+        columns = dict.fromkeys(column for _, record_columns, _ in entries for column in record_columns)
+        self._conn.executemany(
+            "INSERT INTO records (job_id, segment, offset, length) VALUES (?, ?, ?, ?)", rows
+        )
+        self._conn.executemany("INSERT OR IGNORE INTO columns (name) VALUES (?)", [(column,) for column in columns])
+        self._conn.commit()
+
+    def columns(self):
+        # Every column of the output, in the order they first appeared, and
+        # the salary columns
+        self.flush()
+        names = [name for (name,) in self._conn.execute("SELECT name FROM columns ORDER BY seq")]
+        if "salary_range" in names:
+            names += ["salary_min", "salary_max"]
+        return names
+
+    def iter_batches(self, segments=None):
+        # DataFrames of up to `batch_size` merged jobs, from the records in
+        # `segments` (default: all of them)
+        self.flush()
+        where = ""
+        params = []
+        if segments is not None:
+            where = f"WHERE segment IN ({','.join('?' * len(segments))})"
+            params = list(segments) * 2
+        # Jobs in the order they were first found, each job's records in the
+        # order they were appended. SQLite sorts on disk if it has to.
+        yield from self._read_batches(
+            f"""
+            SELECT records.job_id, segment, offset, length FROM records
+            JOIN (SELECT job_id, MIN(seq) AS first FROM records {where} GROUP BY job_id) AS jobs
+                ON jobs.job_id = records.job_id
+            {where}
+            ORDER BY jobs.first, records.seq
+            """,
+            params,
+        )
+
+    def iter_first_found(self, segment):
+        # Same as `iter_batches` for the jobs first found in `segment`, with
+        # their records of every day
+        self.flush()
+        yield from self._read_batches(
+            """
+            SELECT records.job_id, records.segment, records.offset, records.length FROM records
+            JOIN (
+                SELECT job_id, MIN(seq) AS first FROM records
+                WHERE job_id IN (SELECT job_id FROM records WHERE segment = ?)
+                GROUP BY job_id
+            ) AS jobs ON jobs.job_id = records.job_id
+            JOIN records AS firsts ON firsts.seq = jobs.first
+            WHERE firsts.segment = ?
+            ORDER BY jobs.first, records.seq
+            """,
+            [segment, segment],
+        )
+
+    def _read_batches(self, query, params):
+        # Folds the records selected by `query`, which are ordered by job
+        cursor = self._conn.cursor()
+        cursor.execute(query, params)
+        files = {}
+        batch = []
+        records = []
+        current = None
+        try:
+            for job_id, segment, offset, length in cursor:
+                if job_id != current and records:
+                    batch.append(fold(records))
+                    records = []
+                    if len(batch) >= self.batch_size:
+                        yield finish_batch(batch)
+                        batch = []
+                current = job_id
+                if segment not in files:
+                    files[segment] = open(os.path.join(self.directory, segment), "rb")
+                files[segment].seek(offset)
+                records.append(json.loads(files[segment].read(length)))
+            if records:
+                batch.append(fold(records))
+            if batch:
+                yield finish_batch(batch)
+        finally:
+            for segment_file in files.values():
+                segment_file.close()
+
+    def export_csv(self, path, segments=None):
+        # Writes the merged jobs to `path` in one pass, one row per job.
+        # Returns the number of rows written.
+        columns = self.columns()
+        written = 0
+        temporary = f"{path}.tmp"
+        with metrics.span("csv_write", file=path), open(temporary, "w", newline="") as csv_file:
+            for df in self.iter_batches(segments):
+                df.reindex(columns=columns).to_csv(csv_file, header=written == 0, index=False)
+                written += len(df)
+            if not written:
+                csv_file.write(",".join(columns) + "\n")
+        os.replace(temporary, path)
+        return written
+
+    def read(self, segments=None):
+        # The merged jobs of `segments` as one DataFrame with every column
+        columns = self.columns()
+        batches = [df.reindex(columns=columns) for df in self.iter_batches(segments)]
+        return pd.concat(batches, ignore_index=True) if batches else pd.DataFrame(columns=columns)
+
+    def has_records(self, segment):
+        self.flush()
+        return self._conn.execute("SELECT 1 FROM records WHERE segment = ? LIMIT 1", (segment,)).fetchone() is not None
+
+    def _changed_segments(self, columns):
+        # Days whose archive file is out of date: those that first found a
+        # job with records added since the last compaction, and every day if
+        # a column was added
+        row = self._conn.execute("SELECT seq FROM compaction").fetchone()
+        since = row[0] if row else 0
+        changed = {
+            segment
+            for (segment,) in self._conn.execute(
+                """
+                SELECT DISTINCT firsts.segment FROM records AS firsts
+                JOIN (
+                    SELECT MIN(seq) AS first FROM records
+                    WHERE job_id IN (SELECT job_id FROM records WHERE seq > ?)
+                    GROUP BY job_id
+                ) AS jobs ON jobs.first = firsts.seq
+                """,
+                (since,),
+            )
+        }
+        for segment, written_columns in self._conn.execute("SELECT segment, columns FROM compacted"):
+            path = os.path.join(self.directory, ARCHIVE_DIR, archive_name(segment))
+            if written_columns != len(columns) or not os.path.exists(path):
+                changed.add(segment)
+        return sorted(changed)
+
+    def compact(self):
+        # Writes the archive, one Parquet file per day with the jobs first
+        # found that day, batch by batch. Only the days that changed since
+        # the last compaction are written again. Returns the number of jobs
+        # written.
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        directory = os.path.join(self.directory, ARCHIVE_DIR)
+        os.makedirs(directory, exist_ok=True)
+        columns = self.columns()
+        schema = pa.schema(
+            [(column, pa.float64() if column in NUMERIC_COLUMNS else pa.string()) for column in columns]
+        )
+        last_seq = self._conn.execute("SELECT MAX(seq) FROM records").fetchone()[0] or 0
+        changed = self._changed_segments(columns)
+        written = 0
+        with metrics.span("output_compact", days=len(changed)):
+            for segment in changed:
+                path = os.path.join(directory, archive_name(segment))
+                temporary = f"{path}.tmp"
+                with pq.ParquetWriter(temporary, schema) as writer:
+                    for df in self.iter_first_found(segment):
+                        df = df.reindex(columns=columns)
+                        for column in columns:
+                            if column in NUMERIC_COLUMNS:
+                                df[column] = pd.to_numeric(df[column], errors="coerce")
+                            else:
+                                df[column] = df[column].astype("string")
+                        writer.write_table(pa.Table.from_pandas(df, schema=schema, preserve_index=False))
+                        written += len(df)
+                os.replace(temporary, path)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO compacted (segment, columns) VALUES (?, ?)", (segment, len(columns))
+                )
+        self._conn.execute("INSERT OR REPLACE INTO compaction (id, seq) VALUES (0, ?)", (last_seq,))
+        self._conn.commit()
+        logging.info(f"Compacted {written} jobs of {len(changed)} days into {directory}")
+        return written
+
+
+_output = None
+_output_lock = threading.Lock()
+
+
+def get_output():
+    global _output
+    with _output_lock:
+        if _output is None:
+            _output = JobOutput()
+        return _output
@@ -0,0 +1,174 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+JOB_STATE_DB = os.getenv("JOB_STATE_DB", "job_state.db")
+
+# Pipeline stages in the order a posting goes through them
+STAGES = ["searched", "fetched", "extracted", "evaluated"]
+
+
+def job_id_from_url(url):
+    # LinkedIn job ID from a job view or search URL, or a hash of the URL
+    match = re.search(r"/jobs/view/(?:[^/?]*-)?(\d+)", url) or re.search(
+        r"currentJobId=(\d+)", url
+    )
+    if match:
+        return match.group(1)
+    return hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+
+class JobStore:
+    # Durable per-posting pipeline state. Every update is committed right away
+    # so a crashed run can pick up where it stopped.
+
+    def __init__(self, path=JOB_STATE_DB):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                job_link TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                search_data TEXT,
+                page_data TEXT,
+                extraction TEXT,
+                evaluation TEXT,
+                error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                first_seen_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                retries INTEGER NOT NULL DEFAULT 0,
+                failure TEXT
+            )
+            """
+        )
+        # Databases from before the retry policy lack the last two columns
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "retries" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN retries INTEGER NOT NULL DEFAULT 0")
+        if "failure" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN failure TEXT")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_stage ON jobs (stage)")
+        self._conn.commit()
+
+    def _execute(self, query, params=()):
+        with self._lock:
+            cursor = self._conn.execute(query, params)
+            self._conn.commit()
+            return cursor
+
+    def add_searched(self, job_link, search_data):
+        # Registers a posting from the search results; known postings keep
+        # their progress
+        job_id = job_id_from_url(job_link)
+        now = time.time()
+        self._execute(
+            """
+            INSERT INTO jobs (job_id, job_link, stage, search_data, first_seen_at, updated_at)
+            VALUES (?, ?, 'searched', ?, ?, ?)
+            ON CONFLICT (job_id) DO UPDATE SET search_data = excluded.search_data
+            """,
+            (job_id, job_link, json.dumps(search_data, default=str), now, now),
+        )
+        return job_id
+
+    def _advance(self, job_id, stage, column, value):
+        self._execute(
+            f"UPDATE jobs SET stage = ?, {column} = ?, error = NULL, failure = NULL, updated_at = ? WHERE job_id = ?",
+            (stage, value, time.time(), job_id),
+        )
+
+    def mark_fetched(self, job_id, page_data):
+        self._advance(job_id, "fetched", "page_data", json.dumps(page_data, default=str))
+
+    def mark_extracted(self, job_id, extraction):
+        self._advance(job_id, "extracted", "extraction", extraction)
+
+    def mark_evaluated(self, job_id, evaluation):
+        self._advance(job_id, "evaluated", "evaluation", json.dumps(evaluation, default=str))
+
+    def mark_retry(self, job_id, error):
+        self._execute(
+            "UPDATE jobs SET error = ?, retries = retries + 1, updated_at = ? WHERE job_id = ?",
+            (str(error), time.time(), job_id),
+        )
+
+    def mark_failed(self, job_id, error, kind=None):
+        # A given up attempt; `kind` is the error class from retry.classify,
+        # postings that failed permanently are not tried again
+        self._execute(
+            "UPDATE jobs SET error = ?, failure = ?, attempts = attempts + 1, updated_at = ? WHERE job_id = ?",
+            (str(error), kind, time.time(), job_id),
+        )
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        return _to_record(row) if row is not None else None
+
+    def pending(self, until="evaluated", job_ids=None):
+        # Postings that have not reached the `until` stage yet and did not
+        # fail permanently
+        stages = STAGES[: STAGES.index(until)]
+        query = (
+            f"SELECT * FROM jobs WHERE stage IN ({','.join('?' * len(stages))}) "
+            "AND failure IS NOT 'permanent'"
+        )
+        with self._lock:
+            rows = self._conn.execute(query, stages).fetchall()
+        records = [_to_record(row) for row in rows]
+        if job_ids is not None:
+            job_ids = set(job_ids)
+            records = [record for record in records if record["job_id"] in job_ids]
+        return records
+
+    def counts(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT stage, COUNT(*) FROM jobs GROUP BY stage"
+            ).fetchall()
+        counts = dict.fromkeys(STAGES, 0)
+        counts.update({stage: count for stage, count in rows})
+        return counts
+
+    def failure_counts(self):
+        # Postings whose last attempt was given up, by error class
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT failure, COUNT(*) FROM jobs WHERE failure IS NOT NULL GROUP BY failure"
+            ).fetchall()
+        return dict(rows)
+
+
+def reached(record, stage):
+    return STAGES.index(record["stage"]) >= STAGES.index(stage)
+
+
+def _to_record(row):
+    record = dict(row)
+    for column in ("search_data", "page_data", "evaluation"):
+        if record[column] is not None:
+            record[column] = json.loads(record[column])
+    return record
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = JobStore()
+        return _store
@@ -0,0 +1,152 @@
+import asyncio
+import os
+import threading
+import time
+
+import httpx
+from openai import AsyncOpenAI
+
+from metrics import metrics
+from retry import RATE_LIMITED, RetryPolicy, get_breaker
+from tokenizer import count_tokens
+
+# Maximum number of OpenAI requests in flight
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "8"))
+# Rate limits of the OpenAI account, shared by all models
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "500"))
+LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", "80000"))
+LLM_MAX_RETRY = int(os.getenv("LLM_MAX_RETRY", "6"))
+# Tokens reserved for the completion when budgeting a request
+COMPLETION_TOKENS_ESTIMATE = 600
+
+
+def estimate_tokens(messages):
+    return sum(count_tokens(message["content"]) for message in messages) + COMPLETION_TOKENS_ESTIMATE
+
+
+class TokenBucket:
+    # Refills `rate_per_minute` units per minute up to one minute's worth
+
+    def __init__(self, rate_per_minute):
+        self.capacity = rate_per_minute
+        self.rate = rate_per_minute / 60
+        self.tokens = rate_per_minute
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self, amount=1):
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+    def drain(self):
+        # Used after a 429 so that other requests back off as well
+        self._refill()
+        self.tokens = 0
+
+
+class LLMStage:
+    # Runs every OpenAI call on one event loop thread with a single pooled
+    # client, so scraping threads can hand work off and move on to the next page.
+
+    def __init__(
+        self,
+        concurrency=LLM_CONCURRENCY,
+        requests_per_minute=LLM_REQUESTS_PER_MINUTE,
+        tokens_per_minute=LLM_TOKENS_PER_MINUTE,
+        max_retry=LLM_MAX_RETRY,
+    ):
+        self.concurrency = concurrency
+        self.policy = RetryPolicy(max_attempts=max_retry)
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(
+            target=self.loop.run_forever, name="llm-stage", daemon=True
+        )
+        self.thread.start()
+        self.client = AsyncOpenAI(
+            api_key=os.environ.get("OPENAI_API_KEY"),
+            max_retries=0,
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=concurrency,
+                    max_keepalive_connections=concurrency,
+                ),
+                timeout=httpx.Timeout(120.0, connect=10.0),
+            ),
+        )
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._requests = TokenBucket(requests_per_minute)
+        self._tokens = TokenBucket(tokens_per_minute)
+
+    def submit(self, coro):
+        # Schedules `coro` on the stage's loop and returns a concurrent Future
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro):
+        return self.submit(coro).result()
+
+    async def _chat_once(self, model, messages, span, **kwargs):
+        await self._requests.acquire()
+        await self._tokens.acquire(estimate_tokens(messages))
+        async with self._semaphore:
+            completion = await self.client.chat.completions.create(
+                model=model, messages=messages, **kwargs
+            )
+        if completion.usage is not None:
+            span["prompt_tokens"] = completion.usage.prompt_tokens
+            span["completion_tokens"] = completion.usage.completion_tokens
+        return completion.choices[0].message.content
+
+    def _on_retry(self, error, kind):
+        if kind == RATE_LIMITED:
+            # Make the other requests back off as well
+            self._requests.drain()
+
+    async def chat(self, model, messages, **kwargs):
+        with metrics.span("openai_chat", model=model, retries=0) as span:
+            return await self.policy.acall(
+                self._chat_once,
+                model,
+                messages,
+                span,
+                name="openai_chat",
+                breaker=get_breaker("openai"),
+                span=span,
+                on_retry=self._on_retry,
+                **kwargs,
+            )
+
+    def close(self):
+        self.run(self.client.close())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+
+_stage = None
+_stage_lock = threading.Lock()
+
+
+def get_stage():
+    global _stage
+    with _stage_lock:
+        if _stage is None:
+            _stage = LLMStage()
+        return _stage
+
+
+def reset_stage():
+    # Forgets the shared stage and returns it, or None, so it can be closed
+    global _stage
+    with _stage_lock:
+        stage, _stage = _stage, None
+    return stage
@@ -0,0 +1,151 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+LLM_CACHE_FILE = os.getenv("LLM_CACHE_FILE", "llm_cache.db")
+# Set LLM_CACHE_DISABLED=1 to always call the model
+LLM_CACHE_DISABLED = os.getenv("LLM_CACHE_DISABLED", "0") == "1"
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "50000"))
+LLM_CACHE_MAX_AGE_DAYS = float(os.getenv("LLM_CACHE_MAX_AGE_DAYS", "30"))
+# Run the eviction every N writes
+EVICT_EVERY = 100
+
+
+class LLMCache:
+    # On-disk cache of model replies keyed by a hash of the model, the prompt
+    # template and the inputs that were substituted into it.
+
+    def __init__(
+        self,
+        path=LLM_CACHE_FILE,
+        max_entries=LLM_CACHE_MAX_ENTRIES,
+        max_age_days=LLM_CACHE_MAX_AGE_DAYS,
+        enabled=not LLM_CACHE_DISABLED,
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = max_age_days * 24 * 60 * 60
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        if self.enabled:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used_at REAL NOT NULL
+                )
+                """
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS llm_cache_last_used ON llm_cache (last_used_at)"
+            )
+            self._conn.commit()
+
+    @staticmethod
+    def key(model, template, *inputs):
+        digest = hashlib.sha256()
+        for part in (model, template) + inputs:
+            data = str(part).encode("utf-8")
+            # Length-prefix every part so that ("ab", "c") != ("a", "bc")
+            digest.update(len(data).to_bytes(8, "big"))
+            digest.update(data)
+        return digest.hexdigest()
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.max_age:
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE llm_cache SET last_used_at = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def set(self, key, value):
+        if not self.enabled:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            self._writes += 1
+            if self._writes % EVICT_EVERY == 0:
+                self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now):
+        self._conn.execute(
+            "DELETE FROM llm_cache WHERE created_at < ?", (now - self.max_age,)
+        )
+        # Drop the least recently used entries above the size limit
+        self._conn.execute(
+            """
+            DELETE FROM llm_cache WHERE key IN (
+                SELECT key FROM llm_cache ORDER BY last_used_at DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (self.max_entries,),
+        )
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def log_stats(self):
+        stats = self.stats()
+        logging.info(
+            f"LLM cache: {stats['hits']} hits, {stats['misses']} misses "
+            f"({stats['hit_rate']:.0%} hit rate)"
+        )
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMCache()
+        return _cache
+
+
+async def acached_completion(model, template, inputs, call, valid=None):
+    # Returns the cached reply for (model, template, inputs) or stores the
+    # result of `await call()` under that key. Replies failing `valid(reply)`
+    # are neither stored nor served, so a retry asks the model again.
+    cache = get_cache()
+    key = cache.key(model, template, *inputs)
+    value = cache.get(key)
+    if value is not None and valid is not None and not valid(value):
+        value = None
+    if value is None:
+        value = await call()
+        if value is not None and (valid is None or valid(value)):
+            cache.set(key, value)
+    return value
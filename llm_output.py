@@ -0,0 +1,131 @@
+import ast
+import json
+import re
+
+NO_INFORMATION = "No Information Found"
+# Keys of the job description extraction, in the order of the prompt
+EXTRACTION_FIELDS = [
+    "Qualifications",
+    "Preferred Qualifications",
+    "Responsibilities",
+    "Project or job duty description",
+    "Whether they offer a bonus",
+    "Whether they offer equity",
+    "Medical benefits",
+    "Any other useful information",
+]
+# Bullet points kept for the matches and the mismatches
+MAX_POINTS = 3
+
+FENCE = re.compile(r"```(?:json)?\s*(.*?)(?:```|$)", re.DOTALL | re.IGNORECASE)
+TRAILING_COMMA = re.compile(r",\s*([}\]])")
+SMART_QUOTES = str.maketrans({"“": '"', "”": '"', "‘": "'", "’": "'"})
+
+
+def _close_truncated(text):
+    # Closes the strings, arrays and objects left open by a cut off reply
+    closers = []
+    in_string = False
+    escaped = False
+    for char in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            closers.append("}" if char == "{" else "]")
+        elif char in "}]" and closers:
+            closers.pop()
+    if in_string:
+        text += '"'
+    return text.rstrip().rstrip(",") + "".join(reversed(closers))
+
+
+def load_json_reply(reply):
+    # Parses a reply that should be a JSON object, repairing code fences,
+    # text around the object, trailing commas, Python literals and
+    # truncation. Raises ValueError if there is no object to recover.
+    text = str(reply).strip()
+    fence = FENCE.search(text)
+    if fence:
+        text = fence.group(1)
+    start = text.find("{")
+    if start == -1:
+        raise ValueError(f"No JSON object in the reply: {text[:100]!r}")
+    end = text.rfind("}")
+    candidates = [text[start : end + 1]] if end > start else []
+    candidates.append(_close_truncated(text[start:]))
+    candidates += [candidate.translate(SMART_QUOTES) for candidate in candidates]
+    for candidate in candidates:
+        candidate = TRAILING_COMMA.sub(r"\1", candidate)
+        try:
+            # strict=False accepts raw newlines inside strings
+            data = json.loads(candidate, strict=False)
+        except json.JSONDecodeError:
+            try:
+                data = ast.literal_eval(candidate)
+            except (ValueError, SyntaxError):
+                continue
+        if isinstance(data, dict):
+            return data
+    raise ValueError(f"Could not repair the JSON reply: {text[:100]!r}")
+
+
+def _field_key(name):
+    return re.sub(r"[^a-z]", "", name.lower())
+
+
+def _as_text(value):
+    if isinstance(value, str):
+        return value.strip()
+    if isinstance(value, list):
+        return "\n".join(f"- {_as_text(item)}" for item in value)
+    return json.dumps(value)
+
+
+def _as_points(value):
+    if isinstance(value, str):
+        value = [line.strip(" -*•\t") for line in value.splitlines()]
+    elif not isinstance(value, list):
+        value = [value]
+    return [_as_text(item) for item in value if _as_text(item)][:MAX_POINTS]
+
+
+def normalize_extraction(data):
+    # Every extraction field, matched loosely ("qualifications", "1.
+    # Qualifications"), with NO_INFORMATION for the missing ones
+    values = {_field_key(str(key)): value for key, value in data.items()}
+    extraction = {}
+    for field in EXTRACTION_FIELDS:
+        value = values.get(_field_key(field))
+        extraction[field] = _as_text(value) if value not in (None, "", []) else NO_INFORMATION
+    return extraction
+
+
+def normalize_evaluation(data):
+    # Returns the score as an int between 0 and 100 and at most MAX_POINTS
+    # matches and mismatches. Raises ValueError if there is no score.
+    score = data.get("evaluation_score")
+    if isinstance(score, str):
+        number = re.search(r"\d+(?:\.\d+)?", score)
+        score = float(number.group()) if number else None
+    if isinstance(score, bool) or not isinstance(score, (int, float)):
+        raise ValueError(f"The reply has no evaluation score: {data}")
+    return {
+        "evaluation_score": int(round(min(100, max(0, score)))),
+        "matches": _as_points(data.get("matches", [])),
+        "mismatches": _as_points(data.get("mismatches", [])),
+    }
+
+
+def is_valid(parse, reply):
+    try:
+        parse(reply)
+    except (ValueError, TypeError, AttributeError):
+        return False
+    return True
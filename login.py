@@ -1,12 +1,13 @@
-import time
-from webql.sync_api import close_all_popups_handler
+import logging
 
-from dotenv import load_dotenv
-
-load_dotenv()
+from browser import new_driver
+from metrics import metrics, timed_query
+from readiness import wait_for_network_idle
+from retry import RetryPolicy, get_breaker
 
 
 def login(session, email, password, session_name="linkedin_login_session"):
+    from webql.sync_api import close_all_popups_handler
 
     sign_in_query = """
     {
@@ -28,22 +29,50 @@ def login(session, email, password, session_name="linkedin_login_session"):
     }
     """
 
-    response_sign_in = session.query(sign_in_query)
+    response_sign_in = timed_query(session, sign_in_query, "sign_in")
     response_sign_in.sign_in_btn.click(force=True)
 
-    response_credentials = session.query(credentials_query)
+    response_credentials = timed_query(session, credentials_query, "credentials")
     response_credentials.email_input.fill(email)
     response_credentials.password_input.fill(password)
     response_credentials.sign_in_with_password_btn.click(force=True)
     session.on("popup", close_all_popups_handler)
-    response_skip = session.query(skip_query)
+    response_skip = timed_query(session, skip_query, "skip")
     response_skip.skip_btn.click(force=True)
-    response_skip_promos = session.query(skip_query)
+    response_skip_promos = timed_query(session, skip_query, "skip")
     response_skip_promos.skip_btn.click(force=True)
 
-    time.sleep(5)
+    # Let the post-login redirects settle before saving the cookies
+    wait_for_network_idle(session.current_page, timeout=5)
 
     # Save the user session state to a file
     session.save_user_session_state(f"{session_name}.json")
 
     session.stop()
+
+
+def login_with_retry(url, email, password, session_name="linkedin_login_session", headless=True):
+    # Logs in from `url` with a new browser session per attempt and saves the
+    # session state to "{session_name}.json"
+
+    import webql
+
+    def attempt():
+        session = webql.start_session(url, web_driver=new_driver(headless))
+        try:
+            login(session, email, password, session_name)
+        except Exception:
+            try:
+                session.stop()
+            except Exception as e:
+                logging.error(f"Error while stopping the login session: {e}")
+            raise
+
+    with metrics.span("login", retries=0) as span:
+        RetryPolicy().call(
+            attempt,
+            name="login",
+            key=session_name,
+            breaker=get_breaker("linkedin"),
+            span=span,
+        )
@@ -0,0 +1,155 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Write every span to this JSONL file at the end of the run (optional)
+METRICS_JSONL = os.getenv("METRICS_JSONL")
+
+# USD per million prompt / completion tokens
+MODEL_PRICES = {
+    "gpt-3.5-turbo": (0.5, 1.5),
+    "gpt-4-turbo-preview": (10.0, 30.0),
+    "gpt-4-turbo": (10.0, 30.0),
+    "gpt-4o": (5.0, 15.0),
+    "gpt-4o-mini": (0.15, 0.6),
+}
+
+
+def percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    position = (len(values) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+class Metrics:
+    # Collects timed spans around the pipeline stages. A span is a dict that the
+    # caller can annotate while it is open, e.g. with retries or token counts.
+
+    def __init__(self):
+        self.started_at = time.time()
+        self._spans = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, stage, **attributes):
+        record = {"stage": stage, "start": time.time(), "ok": True, **attributes}
+        started = time.perf_counter()
+        try:
+            yield record
+        except BaseException as e:
+            record["ok"] = False
+            record["error"] = e.__class__.__name__
+            raise
+        finally:
+            record["duration"] = time.perf_counter() - started
+            with self._lock:
+                self._spans.append(record)
+
+    def add(self, stage, duration, **attributes):
+        # Records a span that was timed by the caller
+        record = {
+            "stage": stage,
+            "start": time.time() - duration,
+            "ok": True,
+            "duration": duration,
+            **attributes,
+        }
+        with self._lock:
+            self._spans.append(record)
+
+    def spans(self):
+        with self._lock:
+            return list(self._spans)
+
+    def report(self):
+        spans = self.spans()
+        elapsed_minutes = max(time.time() - self.started_at, 1e-9) / 60
+        stages = {}
+        for record in spans:
+            stages.setdefault(record["stage"], []).append(record)
+        report = {"elapsed_seconds": elapsed_minutes * 60, "stages": {}, "models": {}}
+        for stage, records in stages.items():
+            durations = [record["duration"] for record in records]
+            report["stages"][stage] = {
+                "count": len(records),
+                "errors": sum(not record["ok"] for record in records),
+                "retries": sum(record.get("retries", 0) for record in records),
+                "total": sum(durations),
+                "p50": percentile(durations, 0.5),
+                "p95": percentile(durations, 0.95),
+                "per_minute": len(records) / elapsed_minutes,
+            }
+        for record in spans:
+            model = record.get("model")
+            if model is None or "prompt_tokens" not in record:
+                continue
+            usage = report["models"].setdefault(
+                model, {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost": 0.0}
+            )
+            usage["calls"] += 1
+            usage["prompt_tokens"] += record["prompt_tokens"]
+            usage["completion_tokens"] += record["completion_tokens"]
+            prompt_price, completion_price = MODEL_PRICES.get(model, (0.0, 0.0))
+            usage["cost"] += (
+                record["prompt_tokens"] * prompt_price
+                + record["completion_tokens"] * completion_price
+            ) / 1_000_000
+        # Description tokens before and after the preprocessing
+        prepared = [record for record in spans if "tokens_before" in record]
+        report["descriptions"] = {
+            "jobs": len(prepared),
+            "tokens_before": sum(record["tokens_before"] for record in prepared),
+            "tokens_after": sum(record["tokens_after"] for record in prepared),
+        }
+        return report
+
+    def format_report(self):
+        report = self.report()
+        lines = [f"Run time: {report['elapsed_seconds']:.1f}s"]
+        lines.append(
+            f"{'stage':<28}{'count':>7}{'errors':>8}{'retries':>9}{'p50 (s)':>10}{'p95 (s)':>10}{'total (s)':>11}{'/min':>8}"
+        )
+        for stage, stats in sorted(
+            report["stages"].items(), key=lambda item: item[1]["total"], reverse=True
+        ):
+            lines.append(
+                f"{stage:<28}{stats['count']:>7}{stats['errors']:>8}{stats['retries']:>9}"
+                f"{stats['p50']:>10.2f}{stats['p95']:>10.2f}{stats['total']:>11.1f}{stats['per_minute']:>8.1f}"
+            )
+        total_cost = 0.0
+        for model, usage in report["models"].items():
+            total_cost += usage["cost"]
+            lines.append(
+                f"{model}: {usage['calls']} calls, {usage['prompt_tokens']} prompt tokens, "
+                f"{usage['completion_tokens']} completion tokens, ${usage['cost']:.4f}"
+            )
+        lines.append(f"Total OpenAI cost: ${total_cost:.4f}")
+        descriptions = report["descriptions"]
+        if descriptions["jobs"]:
+            saved = descriptions["tokens_before"] - descriptions["tokens_after"]
+            lines.append(
+                f"Description tokens: {descriptions['tokens_before']} -> {descriptions['tokens_after']} "
+                f"({saved / descriptions['jobs']:.0f} saved per job, "
+                f"{saved / max(descriptions['tokens_before'], 1):.0%})"
+            )
+        return "\n".join(lines)
+
+    def export_jsonl(self, path):
+        with open(path, "w") as jsonl_file:
+            for record in self.spans():
+                jsonl_file.write(json.dumps(record, default=str) + "\n")
+
+
+metrics = Metrics()
+
+
+def timed_query(session, query, name):
+    # session.query wrapped in a "session_query" span
+    with metrics.span("session_query", query=name):
+        return session.query(query)
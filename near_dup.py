@@ -0,0 +1,124 @@
+import os
+import re
+import sqlite3
+import threading
+import zlib
+
+import numpy as np
+
+NEAR_DUP_DB = os.getenv("NEAR_DUP_DB", "near_dup.db")
+# Minimum estimated Jaccard similarity of two descriptions to reuse results
+NEAR_DUP_THRESHOLD = float(os.getenv("NEAR_DUP_THRESHOLD", "0.85"))
+# Set NEAR_DUP_DISABLED=1 to process every posting from scratch
+NEAR_DUP_DISABLED = os.getenv("NEAR_DUP_DISABLED", "0") == "1"
+
+SHINGLE_SIZE = 5
+NUM_PERM = 128
+# 16 bands of 8 rows: pairs above ~0.7 similarity almost always share a bucket
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+MERSENNE_PRIME = (1 << 31) - 1
+
+_generator = np.random.default_rng(1)
+_A = _generator.integers(1, MERSENNE_PRIME, NUM_PERM, dtype=np.uint64)
+_B = _generator.integers(0, MERSENNE_PRIME, NUM_PERM, dtype=np.uint64)
+
+
+def shingles(text):
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < SHINGLE_SIZE:
+        return {" ".join(words)} if words else set()
+    return {
+        " ".join(words[i : i + SHINGLE_SIZE])
+        for i in range(len(words) - SHINGLE_SIZE + 1)
+    }
+
+
+def minhash(text):
+    hashes = np.fromiter(
+        (zlib.crc32(shingle.encode("utf-8")) for shingle in shingles(text)),
+        dtype=np.uint64,
+    )
+    if hashes.size == 0:
+        return None
+    # (a * x + b) mod p for every permutation and shingle; fits in uint64
+    # because x < 2^32 and a, b < 2^31
+    permuted = (np.outer(_A, hashes) + _B[:, None]) % MERSENNE_PRIME
+    return permuted.min(axis=1).astype(np.uint32)
+
+
+def similarity(signature, other):
+    return float(np.mean(signature == other))
+
+
+class NearDupIndex:
+    # Persistent MinHash/LSH index of job descriptions. A lookup only compares
+    # signatures that share at least one band bucket with the query.
+
+    def __init__(self, path=NEAR_DUP_DB, threshold=NEAR_DUP_THRESHOLD):
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS signatures (job_id TEXT PRIMARY KEY, signature BLOB NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS buckets (band INTEGER NOT NULL, bucket INTEGER NOT NULL, job_id TEXT NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS buckets_band_bucket ON buckets (band, bucket)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def _buckets(signature):
+        return [
+            (band, zlib.crc32(signature[band * ROWS : (band + 1) * ROWS].tobytes()))
+            for band in range(BANDS)
+        ]
+
+    def add(self, job_id, signature):
+        with self._lock:
+            self._conn.execute("DELETE FROM buckets WHERE job_id = ?", (job_id,))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO signatures VALUES (?, ?)",
+                (job_id, signature.tobytes()),
+            )
+            self._conn.executemany(
+                "INSERT INTO buckets VALUES (?, ?, ?)",
+                [(band, bucket, job_id) for band, bucket in self._buckets(signature)],
+            )
+            self._conn.commit()
+
+    def query(self, signature, exclude=None):
+        # Returns [(job ID, similarity)] above the threshold, best first
+        with self._lock:
+            candidates = set()
+            for band, bucket in self._buckets(signature):
+                rows = self._conn.execute(
+                    "SELECT job_id FROM buckets WHERE band = ? AND bucket = ?",
+                    (band, bucket),
+                ).fetchall()
+                candidates.update(job_id for (job_id,) in rows)
+            candidates.discard(exclude)
+            matches = []
+            for job_id in candidates:
+                (blob,) = self._conn.execute(
+                    "SELECT signature FROM signatures WHERE job_id = ?", (job_id,)
+                ).fetchone()
+                score = similarity(signature, np.frombuffer(blob, dtype=np.uint32))
+                if score >= self.threshold:
+                    matches.append((job_id, score))
+        return sorted(matches, key=lambda match: match[1], reverse=True)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = NearDupIndex()
+        return _index
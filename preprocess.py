@@ -0,0 +1,209 @@
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from metrics import metrics
+from near_dup import NEAR_DUP_THRESHOLD, minhash, similarity
+from tokenizer import count_tokens, truncate_tokens
+
+BOILERPLATE_DB = os.getenv("BOILERPLATE_DB", "boilerplate.db")
+# A paragraph is boilerplate once it appears in this many distinct postings
+# of a company, reposts and near duplicates counting once, and in at least
+# this share of them
+BOILERPLATE_MIN_POSTINGS = int(os.getenv("BOILERPLATE_MIN_POSTINGS", "3"))
+BOILERPLATE_MIN_SHARE = float(os.getenv("BOILERPLATE_MIN_SHARE", "0.5"))
+# Maximum number of description tokens sent per call, 0 for no limit
+DESCRIPTION_TOKEN_BUDGET = int(os.getenv("DESCRIPTION_TOKEN_BUDGET", "1500"))
+# Set PREPROCESS_DISABLED=1 to send the descriptions as scraped
+PREPROCESS_DISABLED = os.getenv("PREPROCESS_DISABLED", "0") == "1"
+
+# Paragraphs shorter than this are headings or bullet points, never learned
+MIN_LEARNED_WORDS = 12
+
+# Legal statements found in most postings, regardless of the company
+KNOWN_BOILERPLATE = [
+    re.compile(pattern, re.IGNORECASE)
+    for pattern in [
+        r"equal (employment )?opportunity",
+        r"without regard to (race|age|color|religion|sex|gender|national origin)",
+        r"(race|color|religion), (sex|gender|color|religion|national origin)",
+        r"reasonable accommodation",
+        r"e-verify",
+        r"affirmative action",
+        r"fair chance (ordinance|initiative|hiring)|arrest (and|or) conviction records",
+        r"(applicant|candidate|recruitment) privacy (notice|policy|statement)",
+        r"(unsolicited|third[- ]party) (resumes|agenc)|recruit(ment|ing) agenc",
+        r"^(show|see) (more|less)$",
+    ]
+]
+# Never dropped, the extraction asks for the pay, bonus, equity and benefits
+PROTECTED = re.compile(
+    r"salary|compensation|pay range|base pay|\$\s?\d|bonus|equity|stock|\brsus?\b"
+    r"|medical|dental|vision|health (insurance|benefits)|401",
+    re.IGNORECASE,
+)
+
+
+def collapse_whitespace(line):
+    return " ".join(line.split())
+
+
+def paragraph_hash(paragraph):
+    # Ignores case and punctuation, so small formatting edits still match
+    words = re.findall(r"\w+", paragraph.lower())
+    if len(words) < MIN_LEARNED_WORDS:
+        return None
+    return hashlib.sha1(" ".join(words).encode("utf-8")).hexdigest()
+
+
+class BoilerplateLearner:
+    # Remembers which paragraphs each company's postings contain, so the ones
+    # repeated across its postings ("About us", perks) can be dropped.
+
+    def __init__(
+        self,
+        path=BOILERPLATE_DB,
+        min_postings=BOILERPLATE_MIN_POSTINGS,
+        min_share=BOILERPLATE_MIN_SHARE,
+        threshold=NEAR_DUP_THRESHOLD,
+    ):
+        self.min_postings = min_postings
+        self.min_share = min_share
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS paragraphs (
+                company TEXT NOT NULL,
+                hash TEXT NOT NULL,
+                job_id TEXT NOT NULL,
+                PRIMARY KEY (company, hash, job_id)
+            )
+            """
+        )
+        # The distinct postings counted, with the MinHash signature of their
+        # description
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS postings (
+                company TEXT NOT NULL,
+                job_id TEXT NOT NULL,
+                signature BLOB,
+                PRIMARY KEY (company, job_id)
+            )
+            """
+        )
+        # Added after the first release, postings learned before count as
+        # distinct
+        self._conn.execute(
+            "INSERT OR IGNORE INTO postings (company, job_id) SELECT DISTINCT company, job_id FROM paragraphs"
+        )
+        self._conn.commit()
+
+    def _is_duplicate(self, company, job_id, signature):
+        # Whether the posting is a repost or near duplicate of one counted
+        # already, in which case it isn't counted again
+        if signature is None:
+            return False
+        rows = self._conn.execute(
+            "SELECT signature FROM postings WHERE company = ? AND job_id != ? AND signature IS NOT NULL",
+            (company, job_id),
+        )
+        return any(
+            similarity(signature, np.frombuffer(blob, dtype=np.uint32)) >= self.threshold
+            for (blob,) in rows
+        )
+
+    def learn(self, company, job_id, hashes, signature=None):
+        # Records the paragraphs of one posting unless it duplicates another
+        # one, returns those that are now found in at least `min_postings`
+        # and `min_share` of the distinct postings of the company
+        hashes = sorted(set(hashes))
+        company = company.strip().lower()
+        with self._lock:
+            known = self._conn.execute(
+                "SELECT 1 FROM postings WHERE company = ? AND job_id = ?", (company, job_id)
+            ).fetchone()
+            if not known and not self._is_duplicate(company, job_id, signature):
+                self._conn.execute(
+                    "INSERT INTO postings VALUES (?, ?, ?)",
+                    (company, job_id, signature.tobytes() if signature is not None else None),
+                )
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO paragraphs VALUES (?, ?, ?)",
+                    [(company, paragraph, job_id) for paragraph in hashes],
+                )
+                self._conn.commit()
+            if not hashes:
+                return set()
+            (postings,) = self._conn.execute(
+                "SELECT COUNT(*) FROM postings WHERE company = ?", (company,)
+            ).fetchone()
+            rows = self._conn.execute(
+                f"""
+                SELECT hash FROM paragraphs
+                WHERE company = ? AND hash IN ({','.join('?' * len(hashes))})
+                GROUP BY hash HAVING COUNT(*) >= ? AND COUNT(*) >= ?
+                """,
+                [company, *hashes, self.min_postings, self.min_share * postings],
+            ).fetchall()
+        return {paragraph for (paragraph,) in rows}
+
+
+_learner = None
+_learner_lock = threading.Lock()
+
+
+def get_learner():
+    global _learner
+    with _learner_lock:
+        if _learner is None:
+            _learner = BoilerplateLearner()
+        return _learner
+
+
+def prepare_description(raw_description, company=None, job_id=None, budget=DESCRIPTION_TOKEN_BUDGET):
+    # Returns the description to prompt with: whitespace collapsed, known and
+    # learned boilerplate dropped and cut to `budget` tokens
+    raw_description = str(raw_description)
+    if PREPROCESS_DISABLED:
+        return raw_description
+    started = time.perf_counter()
+    paragraphs = [collapse_whitespace(line) for line in raw_description.splitlines()]
+    paragraphs = [paragraph for paragraph in paragraphs if paragraph]
+    hashes = [paragraph_hash(paragraph) for paragraph in paragraphs]
+    learned = set()
+    if company and job_id:
+        signature = minhash("\n".join(paragraphs))
+        learned = get_learner().learn(company, job_id, filter(None, hashes), signature)
+    kept = [
+        paragraph
+        for paragraph, hashed in zip(paragraphs, hashes)
+        if PROTECTED.search(paragraph)
+        or not (hashed in learned or any(pattern.search(paragraph) for pattern in KNOWN_BOILERPLATE))
+    ]
+    # A posting made of nothing but boilerplate is sent whole rather than
+    # as an empty prompt
+    description = "\n".join(kept or paragraphs)
+    if budget:
+        description = truncate_tokens(description, budget)
+    tokens_before = count_tokens(raw_description)
+    tokens_after = count_tokens(description)
+    metrics.add(
+        "preprocess",
+        time.perf_counter() - started,
+        tokens_before=tokens_before,
+        tokens_after=tokens_after,
+    )
+    logging.info(
+        f"Description of job {job_id}: {tokens_before} -> {tokens_after} tokens "
+        f"({len(paragraphs) - len(kept) if kept else 0} boilerplate paragraphs dropped)"
+    )
+    return description
@@ -0,0 +1,90 @@
+import os
+import re
+from collections import Counter
+
+import numpy as np
+
+# Only the RANK_TOP_K best matching jobs are sent to the LLM evaluation (0 = all)
+RANK_TOP_K = int(os.getenv("RANK_TOP_K", "0"))
+# Jobs scoring below RANK_THRESHOLD (cosine similarity, 0-1) are not evaluated
+RANK_THRESHOLD = float(os.getenv("RANK_THRESHOLD", "0"))
+
+TOKEN_RE = re.compile(r"[a-z][a-z0-9+#.]*[a-z0-9+#]|[a-z]")
+STOP_WORDS = set(
+    """a an and are as at be by for from has have in is it its of on or our that the
+    their they this to we will with you your who what which all any can may not
+    more other such than then these those were been being into about over""".split()
+)
+
+
+def tokenize(text):
+    return [token for token in TOKEN_RE.findall(text.lower()) if token not in STOP_WORDS]
+
+
+def resume_terms(resume):
+    # Term counts of a resume given as text or as precomputed counts
+    return resume if isinstance(resume, Counter) else Counter(tokenize(resume))
+
+
+def score_resumes(resumes, descriptions):
+    # TF-IDF cosine similarity of every description against every resume,
+    # computed as one batch. `resumes` maps a name -> text or term counts,
+    # `descriptions` maps job ID -> text. Returns name -> job ID -> score.
+    job_ids = list(descriptions)
+    docs = [Counter(tokenize(str(descriptions[job_id]))) for job_id in job_ids]
+    resumes = {name: resume_terms(resume) for name, resume in resumes.items()}
+    resumes = {name: terms for name, terms in resumes.items() if terms}
+    if not docs or not resumes:
+        return {}
+
+    # The IDF only counts the descriptions, so a resume's scores don't depend
+    # on which other resumes are scored along with it
+    document_frequency = Counter()
+    for doc in docs:
+        document_frequency.update(doc.keys())
+    n_docs = len(docs)
+
+    def idf(terms):
+        frequencies = np.fromiter((document_frequency[term] for term in terms), float)
+        return np.log((1 + n_docs) / (1 + frequencies)) + 1
+
+    def weights(counter, terms):
+        # Sublinear term frequency times IDF
+        counts = np.fromiter((counter[term] for term in terms), float)
+        return (1 + np.log(np.maximum(counts, 1))) * (counts > 0) * idf(terms)
+
+    # Only the resumes' terms contribute to the dot products, so the matrix is
+    # restricted to them; the norms still use every term of a description
+    vocabulary = list(dict.fromkeys(term for terms in resumes.values() for term in terms))
+    index = {term: i for i, term in enumerate(vocabulary)}
+    matrix = np.zeros((len(docs), len(vocabulary)), dtype=np.float32)
+    norms = np.ones(len(docs))
+    for row, doc in enumerate(docs):
+        if not doc:
+            continue
+        terms = list(doc)
+        doc_weights = weights(doc, terms)
+        norms[row] = np.linalg.norm(doc_weights)
+        for term, weight in zip(terms, doc_weights):
+            column = index.get(term)
+            if column is not None:
+                matrix[row, column] = weight
+
+    resume_vectors = np.stack([weights(terms, vocabulary) for terms in resumes.values()])
+    resume_vectors /= np.linalg.norm(resume_vectors, axis=1, keepdims=True)
+    scores = matrix @ resume_vectors.T / norms[:, None]
+    return {
+        name: {job_id: float(score) for job_id, score in zip(job_ids, scores[:, column])}
+        for column, name in enumerate(resumes)
+    }
+
+
+def select_jobs(ranked, top_k=RANK_TOP_K, threshold=RANK_THRESHOLD):
+    selected = [job_id for job_id, score in ranked if score >= threshold]
+    if top_k > 0:
+        selected = selected[:top_k]
+    return set(selected)
+
+
+def ranking_enabled():
+    return RANK_TOP_K > 0 or RANK_THRESHOLD > 0
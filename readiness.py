@@ -0,0 +1,80 @@
+import logging
+import os
+
+from metrics import metrics
+
+# Ceiling for every readiness wait, in seconds
+READY_TIMEOUT = float(os.getenv("READY_TIMEOUT", "15"))
+
+
+def _timeout_ms(timeout):
+    return (READY_TIMEOUT if timeout is None else timeout) * 1000
+
+
+def wait_for_selector(page, selector, timeout=None, state="visible"):
+    # Returns True once `selector` is present, False if the ceiling was hit
+    try:
+        with metrics.span("wait_for_selector", selector=selector):
+            page.wait_for_selector(selector, state=state, timeout=_timeout_ms(timeout))
+        return True
+    except Exception as e:
+        logging.info(f"Timed out waiting for '{selector}': {e}")
+        return False
+
+
+def wait_for_network_idle(page, timeout=None):
+    try:
+        with metrics.span("wait_for_network_idle"):
+            page.wait_for_load_state("networkidle", timeout=_timeout_ms(timeout))
+        return True
+    except Exception as e:
+        logging.info(f"Timed out waiting for network idle: {e}")
+        return False
+
+
+def count_children(page, selector, child_selector="li"):
+    javascript_code = """
+    ([selector, childSelector]) => {
+        const element = document.querySelector(selector);
+        return element ? element.querySelectorAll(childSelector).length : 0;
+    }
+    """
+    return page.evaluate(javascript_code, [selector, child_selector])
+
+
+def wait_for_child_count_change(
+    page, selector, previous_count, child_selector="li", timeout=None
+):
+    # Waits until the number of `child_selector` elements under `selector`
+    # differs from `previous_count`, e.g. after scrolling lazy-loaded results
+    javascript_code = """
+    ([selector, childSelector, previousCount]) => {
+        const element = document.querySelector(selector);
+        return element !== null && element.querySelectorAll(childSelector).length !== previousCount;
+    }
+    """
+    try:
+        with metrics.span("wait_for_child_count_change"):
+            page.wait_for_function(
+                javascript_code,
+                arg=[selector, child_selector, previous_count],
+                timeout=_timeout_ms(timeout),
+            )
+        return True
+    except Exception as e:
+        logging.info(f"No change in the children of '{selector}': {e}")
+        return False
+
+
+def wait_for_url_change(page, previous_url, timeout=None):
+    try:
+        with metrics.span("wait_for_url_change"):
+            page.wait_for_function(
+                "(previousUrl) => window.location.href !== previousUrl",
+                arg=previous_url,
+                timeout=_timeout_ms(timeout),
+            )
+        return True
+    except Exception as e:
+        logging.info(f"URL did not change from '{previous_url}': {e}")
+        return False
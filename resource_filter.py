@@ -0,0 +1,133 @@
+import logging
+import os
+import threading
+from urllib.parse import urlparse
+
+
+def _env_list(name, default):
+    return [item.strip() for item in os.getenv(name, default).split(",") if item.strip()]
+
+
+# Set RESOURCE_FILTER_DISABLED=1 to load every resource
+RESOURCE_FILTER_DISABLED = os.getenv("RESOURCE_FILTER_DISABLED", "0") == "1"
+# Playwright resource types that are never needed to read the job text
+BLOCKED_RESOURCE_TYPES = _env_list("BLOCKED_RESOURCE_TYPES", "image,media,font")
+# Analytics and ad domains; subdomains are blocked too
+BLOCKED_DOMAINS = _env_list(
+    "BLOCKED_DOMAINS",
+    "ads.linkedin.com,px.ads.linkedin.com,snap.licdn.com,analytics.pointdrive.linkedin.com,"
+    "doubleclick.net,googletagmanager.com,google-analytics.com,googlesyndication.com,"
+    "bat.bing.com,connect.facebook.net,adservice.google.com",
+)
+# When set, requests to any other domain are blocked
+ALLOWED_DOMAINS = _env_list("ALLOWED_DOMAINS", "")
+
+# Typical transfer size per blocked resource type, used to estimate savings
+ESTIMATED_BYTES = {
+    "image": 25_000,
+    "media": 400_000,
+    "font": 40_000,
+    "script": 60_000,
+    "stylesheet": 30_000,
+    "xhr": 5_000,
+    "fetch": 5_000,
+    "ping": 500,
+}
+DEFAULT_ESTIMATED_BYTES = 2_000
+
+
+def _matches(host, domains):
+    return any(host == domain or host.endswith("." + domain) for domain in domains)
+
+
+class FilterTotals:
+    # Blocked requests and bytes across every browser session of the run
+
+    def __init__(self):
+        self.requests_blocked = 0
+        self.bytes_saved = 0
+        self.requests_allowed = 0
+        self.bytes_loaded = 0
+        self._lock = threading.Lock()
+
+    def add(self, stats):
+        with self._lock:
+            self.requests_blocked += stats["requests_blocked"]
+            self.bytes_saved += stats["estimated_bytes_saved"]
+            self.requests_allowed += stats["requests_allowed"]
+            self.bytes_loaded += stats["bytes_loaded"]
+
+    def log_stats(self):
+        with self._lock:
+            logging.info(
+                f"Resource filter: blocked {self.requests_blocked} requests "
+                f"(~{self.bytes_saved / 1_000_000:.1f} MB saved), loaded "
+                f"{self.requests_allowed} requests ({self.bytes_loaded / 1_000_000:.1f} MB)"
+            )
+
+
+filter_totals = FilterTotals()
+
+
+class ResourceFilter:
+    # Aborts requests by resource type and domain on a Playwright browser
+    # context and counts what was blocked since the last `take_stats()`.
+
+    def __init__(
+        self,
+        blocked_types=BLOCKED_RESOURCE_TYPES,
+        blocked_domains=BLOCKED_DOMAINS,
+        allowed_domains=ALLOWED_DOMAINS,
+    ):
+        self.blocked_types = set(blocked_types)
+        self.blocked_domains = blocked_domains
+        self.allowed_domains = allowed_domains
+        self._reset()
+
+    def _reset(self):
+        self.stats = {
+            "requests_blocked": 0,
+            "estimated_bytes_saved": 0,
+            "requests_allowed": 0,
+            "bytes_loaded": 0,
+            "blocked_by_type": {},
+        }
+
+    def should_block(self, resource_type, url):
+        if resource_type == "document":
+            return False
+        host = urlparse(url).hostname or ""
+        if self.allowed_domains and not _matches(host, self.allowed_domains):
+            return True
+        return resource_type in self.blocked_types or _matches(host, self.blocked_domains)
+
+    def _handle_route(self, route):
+        request = route.request
+        if self.should_block(request.resource_type, request.url):
+            self.stats["requests_blocked"] += 1
+            self.stats["estimated_bytes_saved"] += ESTIMATED_BYTES.get(
+                request.resource_type, DEFAULT_ESTIMATED_BYTES
+            )
+            by_type = self.stats["blocked_by_type"]
+            by_type[request.resource_type] = by_type.get(request.resource_type, 0) + 1
+            route.abort()
+        else:
+            self.stats["requests_allowed"] += 1
+            route.continue_()
+
+    def _handle_response(self, response):
+        try:
+            self.stats["bytes_loaded"] += int(response.headers.get("content-length", 0))
+        except ValueError:
+            pass
+
+    def install(self, context):
+        context.route("**/*", self._handle_route)
+        context.on("response", self._handle_response)
+
+    def take_stats(self):
+        # Returns the counts since the last call, e.g. for one job page
+        stats = self.stats
+        self._reset()
+        filter_totals.add(stats)
+        return stats
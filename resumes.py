@@ -0,0 +1,136 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import Counter
+
+from ranking import tokenize
+from tokenizer import count_tokens
+
+# Comma-separated resume PDFs; the first one is evaluated by the LLM, all of
+# them are scored locally against every job
+RESUME_FILES = [
+    path.strip() for path in os.getenv("RESUME_FILES", "resume.pdf").split(",") if path.strip()
+]
+# Parsed resumes, one JSON file per PDF content hash
+RESUME_CACHE_DIR = os.getenv("RESUME_CACHE_DIR", "resume_cache")
+
+
+def extract_text_from_pdf(pdf_path):
+    # PyMuPDF is only loaded when a resume isn't in the cache
+    import fitz
+
+    with fitz.open(pdf_path) as doc:
+        return "".join(page.get_text() for page in doc)
+
+
+def normalize_text(text):
+    # Whitespace collapsed within lines, empty lines dropped
+    lines = (" ".join(line.split()) for line in text.splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as resume_file:
+        for block in iter(lambda: resume_file.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class Resume:
+    # A parsed resume: its normalized text, its size in tokens and its term
+    # counts for the local ranking
+
+    def __init__(self, path, content_hash, text, tokens, terms):
+        self.path = path
+        self.content_hash = content_hash
+        self.text = text
+        self.tokens = tokens
+        self.terms = Counter(terms)
+
+    @property
+    def name(self):
+        return os.path.splitext(os.path.basename(self.path))[0]
+
+    def __repr__(self):
+        return f"Resume({self.path!r}, {self.tokens} tokens)"
+
+
+class ResumeCache:
+    # Parses each resume PDF once. Parsed resumes are kept in memory and on
+    # disk by content hash, so a PDF is only parsed again when it changes.
+    # The hash itself is only recomputed when the file's size or mtime do.
+
+    def __init__(self, directory=RESUME_CACHE_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._resumes = {}
+        self._hashes = {}
+
+    def _hash(self, path):
+        stat = os.stat(path)
+        signature = (stat.st_size, stat.st_mtime_ns)
+        cached = self._hashes.get(path)
+        if cached is None or cached[0] != signature:
+            cached = (signature, file_hash(path))
+            self._hashes[path] = cached
+        return cached[1]
+
+    def _cache_file(self, content_hash):
+        return os.path.join(self.directory, f"{content_hash}.json")
+
+    def load(self, path):
+        # Raises OSError if the file is missing and fitz's errors if it is
+        # not a readable PDF
+        with self._lock:
+            content_hash = self._hash(path)
+            resume = self._resumes.get(content_hash)
+            if resume is None:
+                resume = self._read(path, content_hash)
+                self._resumes[content_hash] = resume
+            return resume
+
+    def _read(self, path, content_hash):
+        try:
+            with open(self._cache_file(content_hash)) as cache_file:
+                cached = json.load(cache_file)
+            return Resume(path, content_hash, cached["text"], cached["tokens"], cached["terms"])
+        except (OSError, ValueError, KeyError):
+            pass
+        text = normalize_text(extract_text_from_pdf(path))
+        resume = Resume(path, content_hash, text, count_tokens(text), Counter(tokenize(text)))
+        logging.info(f"Parsed {resume}")
+        os.makedirs(self.directory, exist_ok=True)
+        temporary = self._cache_file(content_hash) + ".tmp"
+        with open(temporary, "w") as cache_file:
+            json.dump(
+                {"path": path, "text": resume.text, "tokens": resume.tokens, "terms": resume.terms},
+                cache_file,
+            )
+        os.replace(temporary, self._cache_file(content_hash))
+        return resume
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_resume_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResumeCache()
+        return _cache
+
+
+def load_resumes(paths=None):
+    # The resumes of `paths` (default: RESUME_FILES) that could be read
+    resumes = []
+    for path in paths or RESUME_FILES:
+        try:
+            resumes.append(get_resume_cache().load(path))
+        except Exception as e:
+            logging.error(f"Resume Reading Error ({path}): {e}")
+    return resumes
@@ -0,0 +1,243 @@
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+
+# Error classes
+TRANSIENT = "transient"
+PERMANENT = "permanent"
+RATE_LIMITED = "rate_limited"
+
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", "3"))
+# Backoff before the n-th retry: random between 0 and base * 2^n, capped
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "1"))
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "60"))
+# Consecutive failures that open a circuit, and how long it stays open
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "60"))
+
+PERMANENT_STATUS = {400, 401, 403, 404, 410, 422}
+# LinkedIn answers 999 to clients it thinks are bots
+RATE_LIMIT_STATUS = {429, 999}
+
+
+class PermanentError(Exception):
+    # Won't succeed on a retry, e.g. an expired posting or a login wall
+    pass
+
+
+class RateLimitedError(Exception):
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(RateLimitedError):
+    pass
+
+
+def status_code(error):
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status
+
+
+def retry_after(error):
+    # Seconds to wait as told by the error or its HTTP response, if at all
+    if getattr(error, "retry_after", None) is not None:
+        return error.retry_after
+    response = getattr(error, "response", None)
+    try:
+        return float(response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def classify(error):
+    # An error an inner call gave up on keeps the class it was given there
+    if getattr(error, "kind", None) is not None:
+        return error.kind
+    if isinstance(error, RateLimitedError):
+        return RATE_LIMITED
+    if isinstance(error, PermanentError):
+        return PERMANENT
+    status = status_code(error)
+    if status in RATE_LIMIT_STATUS:
+        return RATE_LIMITED
+    if status in PERMANENT_STATUS:
+        return PERMANENT
+    return TRANSIENT
+
+
+class CircuitBreaker:
+    # Fails calls fast after `failure_threshold` consecutive transient or
+    # rate-limit failures. After `reset_timeout` seconds one call is let
+    # through; its success closes the circuit, its failure reopens it.
+
+    def __init__(self, name, failure_threshold=BREAKER_FAILURES, reset_timeout=BREAKER_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def probing(self):
+        # A call let through an open circuit hasn't been settled yet
+        return self._probing
+
+    def before_call(self):
+        with self._lock:
+            if self.opened_at is None:
+                return
+            remaining = self.opened_at + self.reset_timeout - time.monotonic()
+            if remaining <= 0 and not self._probing:
+                self._probing = True
+                return
+            # While a probe call is out, check again in a second
+            raise CircuitOpenError(
+                f"The {self.name} circuit is open",
+                retry_after=remaining if remaining > 0 else 1.0,
+            )
+
+    def record_success(self):
+        with self._lock:
+            if self.opened_at is not None:
+                logging.info(f"The {self.name} circuit is closed again")
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self, kind):
+        if kind == PERMANENT:
+            # The request was wrong, the service is fine
+            self.record_success()
+            return
+        with self._lock:
+            self.failures += 1
+            if self._probing or (self.opened_at is None and self.failures >= self.failure_threshold):
+                logging.warning(
+                    f"Opening the {self.name} circuit for {self.reset_timeout:.0f}s "
+                    f"after {self.failures} failures"
+                )
+                self.opened_at = time.monotonic()
+            self._probing = False
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name):
+    # One breaker per remote service, e.g. "linkedin" or "openai"
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name)
+        return _breakers[name]
+
+
+class RetryPolicy:
+    # Retries transient and rate-limited errors with jittered exponential
+    # backoff and gives up right away on permanent ones. The retries and, on
+    # give up, the error class are written to the caller's metrics `span`.
+
+    def __init__(self, max_attempts=RETRY_MAX_ATTEMPTS, base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def backoff(self, attempt, error):
+        delay = retry_after(error)
+        if delay is not None:
+            return min(self.max_delay, delay) + random.uniform(0, self.base_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+    def _failed(self, error, attempt, name, span, breaker, on_retry, on_give_up, key):
+        # Returns the delay before the next attempt, or None to give up.
+        # `breaker` is None unless it let the call through.
+        kind = classify(error)
+        label = f"{name} {key}" if key else name
+        # An error that already used up the retries of an inner call is not
+        # retried again, nor counted twice by the breakers, though it still
+        # settles a probe call
+        inner = getattr(error, "gave_up", False)
+        if breaker is not None and (not inner or breaker.probing):
+            breaker.record_failure(kind)
+        if kind == PERMANENT or inner or attempt == self.max_attempts - 1:
+            span["gave_up"] = kind
+            error.gave_up = True
+            error.kind = kind
+            logging.error(f"Giving up on {label} ({kind}): {error}")
+            if on_give_up is not None:
+                on_give_up(error, kind)
+            return None
+        delay = self.backoff(attempt, error)
+        logging.info(
+            f"{label} failed ({kind}, {error.__class__.__name__}: {error}), "
+            f"retrying in {delay:.1f}s"
+        )
+        if on_retry is not None:
+            on_retry(error, kind)
+        return delay
+
+    def call(self, fn, *args, name, key=None, breaker=None, span=None, on_retry=None, on_give_up=None, **kwargs):
+        # Calls `fn(*args, **kwargs)` until it succeeds or the policy gives
+        # up; `key` (e.g. the URL) and `name` identify the call in the logs
+        span = span if span is not None else {}
+        for attempt in range(self.max_attempts):
+            span["retries"] = attempt
+            # Every call let through by the breaker must settle it, or a
+            # probe would keep the circuit open for good
+            called = None
+            try:
+                if breaker is not None:
+                    breaker.before_call()
+                    called = breaker
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                delay = self._failed(e, attempt, name, span, called, on_retry, on_give_up, key)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            except BaseException:
+                # Cancelled or interrupted
+                if called is not None:
+                    called.record_failure(TRANSIENT)
+                raise
+            if breaker is not None:
+                breaker.record_success()
+            return result
+
+    async def acall(self, fn, *args, name, key=None, breaker=None, span=None, on_retry=None, on_give_up=None, **kwargs):
+        # Same as `call` for a coroutine function `fn`
+        span = span if span is not None else {}
+        for attempt in range(self.max_attempts):
+            span["retries"] = attempt
+            # Every call let through by the breaker must settle it, or a
+            # probe would keep the circuit open for good
+            called = None
+            try:
+                if breaker is not None:
+                    breaker.before_call()
+                    called = breaker
+                result = await fn(*args, **kwargs)
+            except Exception as e:
+                delay = self._failed(e, attempt, name, span, called, on_retry, on_give_up, key)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                # Cancelled or interrupted
+                if called is not None:
+                    called.record_failure(TRANSIENT)
+                raise
+            if breaker is not None:
+                breaker.record_success()
+            return result
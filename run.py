@@ -1,66 +1,596 @@
+import argparse
+import asyncio
 import logging
+import os
+import queue
+import socket
+import threading
+import time
+from concurrent.futures import as_completed
 
-from get_job_description import *
-from search import *
-
-today = datetime.today().strftime("%Y_%m_%d")
-CSV_FILE = f"jobs_postings_{today}.csv"
-SEARCH_KEYWORD = "Data Scientist"
-LOCATION_KEYWORD = "California, CA"
-MAX_RETRY = 3
-
-log_filename = f"run_logs_{today}.log"
-logging.basicConfig(
-    filename=log_filename,
-    filemode="w",
-    level=logging.INFO,
-    format="%(asctime)s:%(levelname)s:%(message)s",
+# Loads .env before the modules below read their settings
+from settings import CSV_FILE, LOCATION_KEYWORD, SEARCH_KEYWORD, configure_logging
+
+import pandas as pd
+
+from browser import get_pool
+from cli import add_mode_arguments
+from dom_extract import extraction_stats
+from get_job_description import (
+    LLM_MODE,
+    aevaluate_resume,
+    aextract_and_evaluate,
+    aprocess_job_description,
+    parse_combined,
+    parse_evaluation,
+    scrape_job_description,
+)
+from http_fetch import HTTP_FETCH_DISABLED, get_fetcher, reset_fetcher
+from job_output import ARCHIVE_DIR, OUTPUT_DIR, get_output, segment_name
+from job_store import get_store, job_id_from_url, reached
+from llm import get_stage, reset_stage
+from llm_cache import get_cache
+from metrics import METRICS_JSONL, metrics
+from near_dup import NEAR_DUP_DISABLED, get_index, minhash
+from preprocess import prepare_description
+from ranking import ranking_enabled, score_resumes, select_jobs
+from resource_filter import filter_totals
+from resumes import load_resumes
+from retry import PERMANENT, PermanentError, RetryPolicy, get_breaker
+from search import load_queries, search_and_collect_jobs_batch
+from work_queue import LeaseKeeper, get_work_queue
+
+RETRY_POLICY = RetryPolicy()
+# Number of job descriptions collected concurrently
+MAX_WORKERS = int(os.getenv("MAX_WORKERS", "4"))
+# Seconds between two looks at the work queue of an idle worker or a waiting
+# coordinator
+QUEUE_POLL_SECONDS = float(os.getenv("QUEUE_POLL_SECONDS", "10"))
+
+# Dataframe column -> key in the scraped job page data
+PAGE_COLUMNS = {
+    "posted_how_long_ago": "posted_how_long_ago",
+    "number_of_applicants": "number_of_applicants",
+    "employment_type": "employment_type",
+    "job_function": "job_function",
+}
+EVALUATION_COLUMNS = ["evaluation_score", "matches", "mismatches"]
+DESCRIPTION_COLUMNS = (
+    list(PAGE_COLUMNS) + ["job_description", "match_score"] + EVALUATION_COLUMNS
 )
 
-# Collect jobs postings for the search keyword
-if not os.path.exists(CSV_FILE):
-    search_and_collect_jobs(SEARCH_KEYWORD, LOCATION_KEYWORD)
-
-# Collect job descriptions for the collected job postings
-df = pd.read_csv(CSV_FILE)
-df["posted_how_long_ago"] = pd.NA
-df["number_of_applicants"] = pd.NA
-df["job_description"] = pd.NA
-df["employment_type"] = pd.NA
-df["job_function"] = pd.NA
-df["evaluation_score"] = pd.NA
-df["matches"] = pd.NA
-df["mismatches"] = pd.NA
-
-for idx, row in df.iterrows():
-    job_url = row["job_link"]
-    job_title = row["job_title"]
-    company_name = row["company_name"]
-    if not isinstance(job_url, str):
-        print("Job URL is not a string or it doesn't exist!")
-        continue
-    for i in range(MAX_RETRY):
-        print(f"Attempt {i+1} of {MAX_RETRY}")
+def describe(record):
+    search_data = record["search_data"] or {}
+    return f"{search_data.get('job_title')} at {search_data.get('company_name')}"
+
+
+def record_failures(store, record):
+    # Retry policy callbacks that keep a posting's retries and give-ups
+    return {
+        "on_retry": lambda error, kind: store.mark_retry(record["job_id"], error),
+        "on_give_up": lambda error, kind: store.mark_failed(record["job_id"], error, kind),
+    }
+
+
+def collect_row(record, resume_str, stage, store, evaluate=True):
+    record["started_at"] = time.perf_counter()
+    job_url = record["job_link"]
+    name = describe(record)
+    if not reached(record, "fetched"):
+        print(f"Collecting job description for {name}")
+        print(f"Job URL: {job_url}")
         try:
-            print(f"Collecting job description for {job_title} at {company_name}")
-            print(f"Job URL: {job_url}")
-            data = collect_job_description(job_url)
-            print(f"Collected jobs description data:\n\n {data}")
-
-            # Save the job description to a file
-            df.at[idx, "posted_how_long_ago"] = data["posted_how_long_ago"]
-            df.at[idx, "number_of_applicants"] = data["number_of_applicants"]
-            df.at[idx, "job_description"] = data["text_description"]
-            df.at[idx, "employment_type"] = data["employment_type"]
-            df.at[idx, "job_function"] = data["job_function"]
-            print(f"Job description collected for {job_title} at {company_name}")
-            print("~" * 100)
-            break
+            with metrics.span("scrape_job") as span:
+                data = RETRY_POLICY.call(
+                    scrape_job_description,
+                    job_url,
+                    name="scrape_job",
+                    key=job_url,
+                    breaker=get_breaker("linkedin"),
+                    span=span,
+                    **record_failures(store, record),
+                )
         except Exception as e:
-            print(f"Error: {e}")
-            print(
-                f"Retrying job description collection for {job_title} at {company_name}"
-            )
+            print(f"Failed to collect the job page of {name}: {e}")
+            return None
+        finally:
+            filter_stats = get_pool().take_filter_stats()
+            if filter_stats:
+                logging.info(
+                    f"Blocked {filter_stats['requests_blocked']} requests "
+                    f"(~{filter_stats['estimated_bytes_saved'] / 1000:.0f} kB) for {name}"
+                )
+        record.update(stage="fetched", page_data=data)
+        prompt_description(record)
+        store.mark_fetched(record["job_id"], data)
+    return hand_off(record, resume_str, stage, store, evaluate)
+
+
+def hand_off(record, resume_str, stage, store, evaluate=True):
+    if not NEAR_DUP_DISABLED and not reached(record, "extracted"):
+        reuse_near_duplicate(record, store, get_index())
+    # Hand the description to the LLM stage and move on to the next page
+    return stage.submit(enrich_row(record, resume_str, store, evaluate))
+
+
+def fetch_over_http(records, resume_str, stage, store, evaluate=True):
+    # Downloads the logged out job pages without a browser on the LLM stage's
+    # loop. Returns job ID -> LLM future and the records left for the browser.
+    fetcher = get_fetcher()
+    pending = {}
+    for record in records:
+        record["started_at"] = time.perf_counter()
+        pending[stage.submit(fetcher.fetch(record["job_link"]))] = record
+    results = {}
+    left = []
+    for future in as_completed(pending):
+        record = pending[future]
+        try:
+            data = future.result()
+        except PermanentError as e:
+            print(f"Skipping {describe(record)}: {e}")
+            store.mark_failed(record["job_id"], e, PERMANENT)
+            continue
+        except Exception as e:
+            # Any other error leaves the page to the browser
+            logging.warning(f"HTTP fetch of {record['job_link']} failed: {e.__class__.__name__}: {e}")
+            data = None
+        if not data:
+            left.append(record)
+            continue
+        record.update(stage="fetched", page_data=data)
+        prompt_description(record)
+        store.mark_fetched(record["job_id"], data)
+        results[record["job_id"]] = hand_off(record, resume_str, stage, store, evaluate)
+    fetcher.log_stats()
+    return results, left
+
+
+def reuse_near_duplicate(record, store, index):
+    # Copies the extraction and evaluation of an earlier posting with a
+    # near-identical description, e.g. a repost under a new URL
+    signature = minhash(str(record["page_data"]["raw_description"]))
+    if signature is None:
+        return
+    for job_id, score in index.query(signature, exclude=record["job_id"]):
+        match = store.get(job_id)
+        if match is None or not reached(match, "extracted"):
             continue
+        logging.info(
+            f"{describe(record)} is a near duplicate of job {job_id} ({score:.0%} similar)"
+        )
+        store.mark_extracted(record["job_id"], match["extraction"])
+        record.update(stage="extracted", extraction=match["extraction"])
+        if reached(match, "evaluated"):
+            store.mark_evaluated(record["job_id"], match["evaluation"])
+            record.update(stage="evaluated", evaluation=match["evaluation"])
+        break
+    index.add(record["job_id"], signature)
+
+
+def prompt_description(record):
+    # Prepared once, when the page is fetched, and stored with the page: the
+    # learned boilerplate grows with every posting, so preparing it again on
+    # a later run would change the prompt and miss the LLM cache
+    page_data = record["page_data"]
+    if page_data.get("prompt_description") is None:
+        company = page_data.get("company_name") or (record["search_data"] or {}).get("company_name")
+        page_data["prompt_description"] = prepare_description(
+            page_data["raw_description"], company, record["job_id"]
+        )
+    return page_data["prompt_description"]
+
+
+async def enrich_once(record, resume_str, store, evaluate, description):
+    if (
+        LLM_MODE == "combined"
+        and evaluate
+        and resume_str
+        and not reached(record, "extracted")
+    ):
+        # One call for both; an unusable reply is asked for again by the
+        # retry policy, the page is not scraped again
+        reply = await aextract_and_evaluate(
+            resume_str, description, record["page_data"].get("job_title", "")
+        )
+        logging.info(f"Extraction and evaluation:\n\n{reply}")
+        extraction, evaluation = parse_combined(reply)
+        print(f"Evals score: {evaluation['evaluation_score']}")
+        store.mark_extracted(record["job_id"], extraction)
+        store.mark_evaluated(record["job_id"], evaluation)
+        record.update(stage="evaluated", extraction=extraction, evaluation=evaluation)
+    if not reached(record, "extracted"):
+        extraction = await aprocess_job_description(description)
+        logging.info(f"Job Description from chatgpt:\n\n{extraction}")
+        store.mark_extracted(record["job_id"], extraction)
+        record.update(stage="extracted", extraction=extraction)
+    if evaluate and resume_str and not reached(record, "evaluated"):
+        evaluation = await aevaluate_resume(
+            resume_str,
+            record["extraction"],
+            record["page_data"].get("job_title", ""),
+        )
+        logging.info(f"Resume Evaluation:\n\n{evaluation}")
+        evals = parse_evaluation(evaluation)
+        evaluation = {column: evals[column] for column in EVALUATION_COLUMNS}
+        print(f"Evals score: {evaluation['evaluation_score']}")
+        store.mark_evaluated(record["job_id"], evaluation)
+        record.update(stage="evaluated", evaluation=evaluation)
+
+
+async def enrich_row(record, resume_str, store, evaluate=True):
+    description = None
+    if not reached(record, "extracted"):
+        description = record["page_data"].get("prompt_description")
+        if description is None:
+            # Fetched by an earlier version: the boilerplate database and the
+            # tokenizer stay off the LLM stage's event loop
+            description = await asyncio.to_thread(prompt_description, record)
+            store.mark_fetched(record["job_id"], record["page_data"])
+    try:
+        # OpenAI errors were already retried by the LLM stage, this retries
+        # replies that could not be parsed
+        await RETRY_POLICY.acall(
+            enrich_once,
+            record,
+            resume_str,
+            store,
+            evaluate,
+            description,
+            name="enrich_job",
+            key=record["job_link"],
+            **record_failures(store, record),
+        )
+    except Exception as e:
+        logging.error(f"Error processing {describe(record)}: {e}")
+        return False
+    if "started_at" in record:
+        # End-to-end time of the job, from its page load to its last LLM reply
+        metrics.add("job", time.perf_counter() - record.pop("started_at"))
+    return True
+
+
+def collect_worker(tasks, results, lock, resume_str, stage, store, evaluate):
+    # Each worker keeps one browser session open for all of its job links
+    pool = get_pool()
+    try:
+        while True:
+            try:
+                record = tasks.get_nowait()
+            except queue.Empty:
+                return
+            future = collect_row(record, resume_str, stage, store, evaluate)
+            with lock:
+                results[record["job_id"]] = future
+    finally:
+        pool.release()
+
+
+def register_jobs(df, store):
+    # Adds today's search results to the job store, returns row index -> job ID
+    job_ids = {}
+    for idx, row in df.iterrows():
+        job_url = row["job_link"]
+        if not isinstance(job_url, str):
+            print("Job URL is not a string or it doesn't exist!")
+            continue
+        job_ids[idx] = store.add_searched(job_url, row.to_dict())
+    return job_ids
+
+
+def row_from_record(record, resume_str):
+    page_data = record["page_data"] or {}
+    row = {column: page_data.get(key) for column, key in PAGE_COLUMNS.items()}
+    row["job_description"] = record["extraction"]
+    if record["evaluation"] is not None:
+        row.update(record["evaluation"])
+    elif not resume_str:
+        row.update(dict.fromkeys(EVALUATION_COLUMNS, "No resume provided for evaluation"))
+    return row
+
+
+def collect_posting(job_url, resume_str=None):
+    # Collects, extracts and evaluates a single posting, e.g. from a
+    # notebook. Returns its page data with the extraction and evaluation,
+    # or {} if it failed.
+    store = get_store()
+    if resume_str is None:
+        resumes = load_resumes()
+        resume_str = resumes[0].text if resumes else ""
+    job_id = job_id_from_url(job_url)
+    if store.get(job_id) is None:
+        store.add_searched(job_url, {})
+    record = store.get(job_id)
+    stage = get_stage()
+    futures = []
+    if not reached(record, "evaluated" if resume_str else "extracted"):
+        left = [record]
+        if not HTTP_FETCH_DISABLED and not reached(record, "fetched"):
+            results, left = fetch_over_http(left, resume_str, stage, store)
+            futures += results.values()
+        try:
+            futures += [collect_row(record, resume_str, stage, store) for record in left]
+        finally:
+            get_pool().release()
+    for future in futures:
+        if future is not None:
+            future.result()
+    record = store.get(job_id)
+    if not reached(record, "extracted"):
+        return {}
+    return {**record["page_data"], **row_from_record(record, resume_str)}
+
+
+def local_scores(records, resumes):
+    # Scores every fetched description against every resume locally, in one
+    # batch. Returns resume name -> job ID -> score.
+    descriptions = {
+        job_id: record["page_data"]["raw_description"]
+        for job_id, record in records.items()
+        if reached(record, "fetched")
+    }
+    return score_resumes({resume.name: resume.terms for resume in resumes}, descriptions)
+
+
+def rank_and_evaluate(job_ids, resumes, stage, store):
+    # Only sends the best local matches of the first resume to the LLM
+    # evaluation. Returns resume name -> job ID -> score.
+    records = {job_id: store.get(job_id) for job_id in set(job_ids)}
+    scores = local_scores(records, resumes)
+    resume = resumes[0]
+    ranked = sorted(scores.get(resume.name, {}).items(), key=lambda item: item[1], reverse=True)
+    selected = select_jobs(ranked)
+    print(f"Evaluating the {len(selected)} best matches out of {len(ranked)} jobs")
+    futures = [
+        stage.submit(enrich_row(records[job_id], resume.text, store))
+        for job_id in selected
+        if reached(records[job_id], "extracted")
+        and not reached(records[job_id], "evaluated")
+    ]
+    for future in futures:
+        future.result()
+    return scores
+
+
+def evaluate_extracted(job_ids, resume_str, stage, store):
+    # Evaluates the resume against the postings that were extracted but not
+    # evaluated, e.g. by the workers of a coordinator
+    records = store.pending(until="evaluated", job_ids=job_ids)
+    futures = [
+        stage.submit(enrich_row(record, resume_str, store))
+        for record in records
+        if reached(record, "extracted")
+    ]
+    for future in futures:
+        future.result()
+
+
+def collect_job_descriptions(df, store, max_workers=MAX_WORKERS, resumes=None, fetch=True):
+    # Without `fetch` the pages are not loaded, only the postings extracted
+    # already (e.g. by workers) are ranked and evaluated
+    job_ids = register_jobs(df, store)
+    # Every resume is parsed once; the first one is evaluated by the LLM.
+    # With `resumes=[]` the jobs are only extracted.
+    if resumes is None:
+        resumes = load_resumes()
+    for resume in resumes:
+        print(f"Resume {resume.path}: {resume.tokens} tokens")
+    resume_str = resumes[0].text if resumes else ""
+    # With pre-ranking, every job is extracted first and only the best
+    # matches are evaluated afterwards
+    rank = bool(resume_str) and ranking_enabled()
+    # Only postings that are new or didn't finish on a previous run
+    until = "evaluated" if resume_str and not rank else "extracted"
+    records = store.pending(until=until, job_ids=job_ids.values()) if fetch else []
+    print(f"{len(records)} of {len(job_ids)} job postings left to process")
+
+    stage = get_stage()
+
+    # Public job pages are read over plain HTTP first; only the pages that
+    # can't be parsed that way are loaded in a browser
+    results = {}
+    if not HTTP_FETCH_DISABLED:
+        fetched = [record for record in records if reached(record, "fetched")]
+        unfetched = [record for record in records if not reached(record, "fetched")]
+        results, left = fetch_over_http(unfetched, resume_str, stage, store, not rank)
+        print(f"{len(unfetched) - len(left)} job pages read over HTTP")
+        records = left + fetched
+    tasks = queue.Queue()
+    for record in records:
+        tasks.put(record)
+
+    # Each worker picks the next job link from the queue until it is empty,
+    # while the LLM stage processes the descriptions scraped so far
+    lock = threading.Lock()
+    workers = [
+        threading.Thread(
+            target=collect_worker,
+            args=(tasks, results, lock, resume_str, stage, store, not rank),
+        )
+        for _ in range(max(1, min(max_workers, tasks.qsize())))
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    for future in results.values():
+        if future is not None:
+            future.result()
+
+    if resume_str and not rank and not fetch:
+        evaluate_extracted(job_ids.values(), resume_str, stage, store)
+    scores = {}
+    if rank:
+        scores = rank_and_evaluate(job_ids.values(), resumes, stage, store)
+    elif len(resumes) > 1:
+        scores = local_scores({job_id: store.get(job_id) for job_id in set(job_ids.values())}, resumes)
+
+    # Write the results back from the main thread, one row per job link
+    for idx, job_id in job_ids.items():
+        record = store.get(job_id)
+        name = describe(record)
+        if resumes:
+            df.at[idx, "match_score"] = scores.get(resumes[0].name, {}).get(job_id, pd.NA)
+        if len(resumes) > 1:
+            # One local score per resume, to compare them
+            for resume in resumes:
+                df.at[idx, f"match_score_{resume.name}"] = scores.get(resume.name, {}).get(job_id, pd.NA)
+        if not reached(record, until):
+            logging.error(f"Failed to collect job description for {name}")
+            print(f"Failed to collect job description for {name}")
+            continue
+        for column, value in row_from_record(record, resume_str).items():
+            df.at[idx, column] = value
+        print(f"Job description collected for {name}")
+        print("~" * 100)
+    return df
+
+
+def search_results(output, search=True):
+    # Today's search results, from the output archive, searching first
+    # unless they were saved already. None if there are none and `search`
+    # is False.
+    if not output.has_records(segment_name()):
+        if not search:
+            return None
+        search_and_collect_jobs_batch(load_queries([(SEARCH_KEYWORD, LOCATION_KEYWORD)]))
+        get_pool().release()
+    df = output.read(segments=[segment_name()])
+    for column in DESCRIPTION_COLUMNS:
+        df[column] = pd.NA
+    return df
+
+
+def run_coordinator(work_queue, df, store, poll_interval=QUEUE_POLL_SECONDS):
+    # Queues the postings of `df` that aren't extracted yet for the workers
+    # and, once they are all done, adds the workers' pages and extractions
+    # to `store`, so the whole set is ranked and evaluated here
+    job_ids = register_jobs(df, store)
+    records = store.pending(until="extracted", job_ids=job_ids.values())
+    added = 0
+    for record in records:
+        added += work_queue.enqueue(record["job_id"], record["job_link"], record["search_data"])
+    print(f"{added} of {len(job_ids)} job postings queued for the workers")
+
+    while not work_queue.drained():
+        print(f"Work queue: {work_queue.counts()}")
+        time.sleep(poll_interval)
+    print(f"Work queue: {work_queue.counts()}")
+
+    results = work_queue.results([record["job_id"] for record in records])
+    for record in records:
+        result = results.get(record["job_id"])
+        if result is None:
+            continue
+        store.mark_fetched(record["job_id"], result["page_data"])
+        store.mark_extracted(record["job_id"], result["extraction"])
+
+
+def run_worker(work_queue, store, worker_id=None, batch_size=MAX_WORKERS, poll_interval=QUEUE_POLL_SECONDS):
+    # Leases postings from the work queue and extracts their descriptions
+    # until no posting is left. The coordinator ranks and evaluates them
+    # once every posting is in. Returns the number of completed postings.
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    completed = 0
+    while True:
+        tasks = work_queue.lease(worker_id, batch_size)
+        if not tasks:
+            # Postings leased by other workers come back if their lease expires
+            if work_queue.drained():
+                return completed
+            time.sleep(poll_interval)
+            continue
+        print(f"Worker {worker_id} leased {len(tasks)} job postings")
+        with LeaseKeeper(work_queue, tasks):
+            df = pd.DataFrame([{**task["payload"], "job_link": task["job_link"]} for task in tasks])
+            for column in DESCRIPTION_COLUMNS:
+                df[column] = pd.NA
+            collect_job_descriptions(df, store, resumes=[])
+        for task in tasks:
+            record = store.get(task["job_id"]) or {}
+            if record and reached(record, "extracted"):
+                result = {"page_data": record["page_data"], "extraction": record["extraction"]}
+                completed += work_queue.complete(task, result)
+                continue
+            work_queue.fail(
+                task,
+                record.get("error") or "Failed to collect the job description",
+                permanent=record.get("failure") == PERMANENT,
+            )
+
+
+def save_results(df, output):
+    # Appends the collected columns to the output archive, writes today's
+    # CSV from it and compacts the archive
+    collected = [column for column in df.columns if column in DESCRIPTION_COLUMNS or column.startswith("match_score_")]
+    linked = df["job_link"].map(lambda job_url: isinstance(job_url, str))
+    output.append_rows(df.loc[linked, ["job_link"] + collected])
+    written = output.export_csv(CSV_FILE, segments=[segment_name()])
+    print(f"Data saved to {CSV_FILE} ({written} jobs)")
+    jobs = output.compact()
+    print(f"{jobs} jobs archived to {os.path.join(OUTPUT_DIR, ARCHIVE_DIR)}")
+
+
+def close_clients():
+    # Closes the pooled OpenAI and HTTP clients. The fetcher's client runs on
+    # the LLM stage's loop, so it is closed before the stage stops.
+    stage = reset_stage()
+    fetcher = reset_fetcher()
+    if stage is None:
+        return
+    if fetcher is not None:
+        stage.run(fetcher.close())
+    stage.close()
+
+
+def finish_run(store):
+    close_clients()
+    print(f"Job states: {store.counts()}")
+    get_cache().log_stats()
+    extraction_stats.log_stats()
+    filter_totals.log_stats()
+
+    report = metrics.format_report()
+    print(report)
+    logging.info(f"Run report:\n{report}")
+    if METRICS_JSONL:
+        metrics.export_jsonl(METRICS_JSONL)
+
+
+def run_pipeline(mode="local", worker_id=None, evaluate=True, search=True):
+    # Collects (and with `evaluate`, evaluates) today's job postings on this
+    # machine, as the coordinator of other workers, or as one of them.
+    # Without `search`, today's search results must exist already.
+    store = get_store()
+    resumes = None if evaluate else []
+    if mode == "worker":
+        completed = run_worker(get_work_queue(), store, worker_id)
+        print(f"Worker completed {completed} job postings")
+    else:
+        output = get_output()
+        df = search_results(output, search)
+        if df is None:
+            print(f"No search results for today in {OUTPUT_DIR}, search first")
+            return False
+        if mode == "coordinator":
+            run_coordinator(get_work_queue(), df, store)
+        df = collect_job_descriptions(df, store, resumes=resumes, fetch=mode != "coordinator")
+        save_results(df, output)
+    finish_run(store)
+    return True
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Search LinkedIn jobs and evaluate them against your resume")
+    add_mode_arguments(parser)
+    return parser.parse_args()
+
+
+def main():
+    configure_logging()
+    args = parse_args()
+    run_pipeline(args.mode, args.worker_id)
+
 
-df.to_csv(CSV_FILE, index=False)
+if __name__ == "__main__":
+    main()
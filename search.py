@@ -1,42 +1,66 @@
-import csv
 import json
+import logging
 import os
-import re
-import time
-from datetime import datetime
+import queue
+import threading
+from urllib.parse import urlencode
 
 import uuid
-import pandas as pd
-import webql
-from dotenv import load_dotenv
-from webql.sync_api.session import Session
-from webql.sync_api.web import PlaywrightWebDriver
 
-from login import *
-
-load_dotenv()
-
-today = datetime.today().strftime("%Y_%m_%d")
-CSV_FILE = f"jobs_postings_{today}.csv"
-
-URL = "https://www.linkedin.com/jobs"
-EMAIL = os.environ.get("EMAIL")
-PASSWORD = os.environ.get("PASSWORD")
-LOGIN_SESSION_NAME = os.environ.get("LOGIN_SESSION_NAME")
-SEARCH_SESSION_NAME = os.environ.get("SEARCH_SESSION_NAME")
-
-
-def clean_text(text):
-    # Check if the input is not a string (e.g., NaN or float)
-    if not isinstance(text, str):
-        return text  # Return the input as-is if it's not a string
-
-    # Proceed with cleaning if the input is a string
-    cleaned_text = re.sub(r"[^\w$/.()]+", ".", text)
-    return cleaned_text
+# Loads .env before the modules below read their settings
+from settings import CSV_FILE
+
+from browser import get_pool
+from dom_extract import extract_job_cards
+from job_output import get_output, segment_name
+from job_store import job_id_from_url
+from metrics import metrics, timed_query
+from readiness import (
+    count_children,
+    wait_for_child_count_change,
+    wait_for_selector,
+    wait_for_url_change,
+)
+from sessions import get_session_manager
+
+URL = os.environ.get("LINKEDIN_URL", "https://www.linkedin.com/jobs")
+
+RESULTS_LIST = "div.jobs-search-results-list"
+JOB_CARD = 'a[href*="/jobs/view/"]'
+SCROLL_TIMEOUT = float(os.getenv("SCROLL_TIMEOUT", "2"))
+# Results pages read per query, LinkedIn shows 25 jobs per page
+SEARCH_MAX_PAGES = int(os.getenv("SEARCH_MAX_PAGES", "3"))
+SEARCH_PAGE_SIZE = 25
+# Queries searched in parallel, each in its own browser
+SEARCH_CONCURRENCY = int(os.getenv("SEARCH_CONCURRENCY", "4"))
+# JSON list of {"keyword": ..., "location": ...}, or {"keywords": [...],
+# "locations": [...]} to search every combination
+SEARCH_QUERIES_FILE = os.getenv("SEARCH_QUERIES_FILE", "search_queries.json")
+
+
+def job_link(href):
+    if href.startswith("http"):
+        return href
+    return "www.linkedin.com" + href
+
+
+def rendered_job_ids(session):
+    # LinkedIn job IDs of the cards currently rendered in the results list
+    javascript_code = """
+    ([resultsSelector, cardSelector]) => {
+        const resultsList = document.querySelector(resultsSelector);
+        if (!resultsList) return [];
+        return Array.from(resultsList.querySelectorAll(cardSelector)).map(card => card.getAttribute('href'));
+    }
+    """
+    hrefs = session.current_page.evaluate(javascript_code, [RESULTS_LIST, JOB_CARD])
+    return {job_id_from_url(href) for href in hrefs if href}
 
 
-def collect_data(session):
+def collect_data(session, seen_ids=None):
+    # Returns the cards not in `seen_ids` and adds their job IDs to it
+    if seen_ids is None:
+        seen_ids = set()
     JOB_QUERY = """
     {
         jobs[] {
@@ -48,20 +72,36 @@ def collect_data(session):
         }
     }
     """
-    response = session.query(JOB_QUERY)
+    # Read the cards with plain selectors, ask webql only if they found nothing
+    jobs_data = extract_job_cards(session.current_page, RESULTS_LIST)
+    if jobs_data:
+        urls = [job_link(job["job_url"]) for job in jobs_data]
+    else:
+        response = timed_query(session, JOB_QUERY, "jobs")
+        jobs_data = response.jobs.to_data()
+        urls = []
+        for i in range(len(response.jobs)):
+            try:
+                urls.append(job_link(response.jobs[i].job_url.get_attribute("href")))
+            except Exception as e:
+                print("~" * 100)
+                print(f"Error: {e}")
+                print(f"Response jobs: {response.jobs}")
+                print("~" * 100)
+                urls.append("")
+    new_data = []
     jobs_url = []
-    for i in range(len(response.jobs)):
-        try:
-            jobs_url.extend(
-                ["www.linkedin.com" + response.jobs[i].job_url.get_attribute("href")]
-            )
-        except Exception as e:
-            print("~" * 100)
-            print(f"Error: {e}")
-            print(f"Response jobs: {response.jobs}")
-            print("~" * 100)
-            jobs_url.extend([""])
-    return response.jobs.to_data(), jobs_url
+    for i, job_url in enumerate(urls):
+        # The link goes to the "job_link" column
+        jobs_data[i].pop("job_url", None)
+        if job_url:
+            job_id = job_id_from_url(job_url)
+            if job_id in seen_ids:
+                continue
+            seen_ids.add(job_id)
+        new_data.append(jobs_data[i])
+        jobs_url.append(job_url)
+    return new_data, jobs_url
 
 
 def scroll_down(session):
@@ -87,27 +127,37 @@ def check_end_of_page(session):
     return session.current_page.evaluate(javascript_code)
 
 
-def search_and_collect_jobs(search_keyword, location_keyword, headless=True):
+def search_url(search_keyword, location_keyword, start=0):
+    params = {"keywords": search_keyword, "location": location_keyword}
+    if start:
+        params["start"] = start
+    return f"{URL}/search/?" + urlencode(params)
 
-    # Login
-    if os.path.exists(f"{LOGIN_SESSION_NAME}.json"):
-        login_session_state = Session.load_user_session_state(
-            f"{LOGIN_SESSION_NAME}.json"
-        )
+
+def query_label(search_keyword, location_keyword):
+    return f"{search_keyword} | {location_keyword}"
+
+
+def load_queries(default, path=SEARCH_QUERIES_FILE):
+    # Returns the (keyword, location) pairs to search, `default` without a
+    # queries file
+    if not os.path.exists(path):
+        return list(default)
+    with open(path) as queries_file:
+        entries = json.load(queries_file)
+    if isinstance(entries, dict):
+        queries = [
+            (keyword, location)
+            for keyword in entries["keywords"]
+            for location in entries["locations"]
+        ]
     else:
-        driver = PlaywrightWebDriver(headless=headless)
-        login_session = webql.start_session(URL, web_driver=driver)
-        login(login_session, EMAIL, PASSWORD)
-        login_session_state = Session.load_user_session_state(
-            f"{LOGIN_SESSION_NAME}.json"
-        )
+        queries = [(entry["keyword"], entry["location"]) for entry in entries]
+    # Same order, without repeated queries
+    return list(dict.fromkeys(queries))
 
-    # Search for jobs
-    driver = PlaywrightWebDriver(headless=headless)
-    search_session = webql.start_session(
-        URL, web_driver=driver, storage_state=login_session_state
-    )
 
+def fill_search_form(session, search_keyword, location_keyword):
     SEARCH_QUERY = """
     {
         search_box
@@ -115,11 +165,13 @@ def search_and_collect_jobs(search_keyword, location_keyword, headless=True):
     }
     """
 
-    response = search_session.query(SEARCH_QUERY)
+    response = timed_query(session, SEARCH_QUERY, "search")
+    previous_url = session.current_page.url
     response.search_box.fill(search_keyword)
     response.search_box.press("Enter")
 
-    time.sleep(5)
+    wait_for_url_change(session.current_page, previous_url)
+    wait_for_selector(session.current_page, RESULTS_LIST)
 
     LOCATION_QUERY = """
     {
@@ -127,11 +179,28 @@ def search_and_collect_jobs(search_keyword, location_keyword, headless=True):
     }
     """
 
-    response = search_session.query(LOCATION_QUERY)
+    response = timed_query(session, LOCATION_QUERY, "location")
+    previous_url = session.current_page.url
     response.location_search_box.fill(location_keyword)
     response.location_search_box.press("Enter")
 
-    time.sleep(5)
+    wait_for_url_change(session.current_page, previous_url)
+    wait_for_selector(session.current_page, RESULTS_LIST)
+
+
+def search_jobs(session, search_keyword, location_keyword, seen_ids=None, search_form=True):
+    # The session is expected on `search_url(...)`; if LinkedIn didn't render
+    # the results there, search through the form on the jobs page instead.
+    # Later results pages have no form to fall back to, no results there
+    # means the query has no more jobs.
+    if seen_ids is None:
+        seen_ids = set()
+    if not wait_for_selector(session.current_page, RESULTS_LIST):
+        if not search_form:
+            return [], []
+        with metrics.span("navigate"):
+            session.current_page.goto(URL)
+        fill_search_form(session, search_keyword, location_keyword)
 
     # Collect jobs data
     all_data = []
@@ -139,61 +208,125 @@ def search_and_collect_jobs(search_keyword, location_keyword, headless=True):
     reached_end = False
 
     while not reached_end:
-        current_data, jobs_url = collect_data(search_session)
-        # print(f"Current data:\n\n {current_data}")
-        # print("-" * 100)
-        # print(f"Jobs URL:\n\n {jobs_url}")
-        # print("-" * 100)
-        if current_data:
-            all_data.extend(current_data)
-            all_jobs_url.extend(jobs_url)
-
-        scroll_down(search_session)
-        time.sleep(2)
+        # Only query the page when cards we haven't seen yet were rendered
+        rendered_ids = rendered_job_ids(session)
+        if not rendered_ids or rendered_ids - seen_ids:
+            current_data, jobs_url = collect_data(session, seen_ids)
+            if current_data:
+                all_data.extend(current_data)
+                all_jobs_url.extend(jobs_url)
+
+        rendered_cards = count_children(session.current_page, RESULTS_LIST, JOB_CARD)
+        scroll_down(session)
+        # Wait for the next batch of cards to render, at most SCROLL_TIMEOUT seconds
+        new_cards = wait_for_child_count_change(
+            session.current_page,
+            RESULTS_LIST,
+            rendered_cards,
+            child_selector=JOB_CARD,
+            timeout=SCROLL_TIMEOUT,
+        )
 
         # Check if we reached the end of the page
-        reached_end = check_end_of_page(search_session)
-
-    # Now `all_data` contains the information of all jobs loaded during the scrolling
-    # Save the collected data to JSON and CSV as in your original code
-    with open("search_scraped_jobs.json", "w") as json_file:
-        json.dump(all_data, json_file)
-
-    with open(CSV_FILE, "w", newline="") as csv_file:
-        writer = csv.writer(csv_file)
-
-        # Write the headers to the CSV file
-        headers = list(all_data[0].keys()) + ["job_link"] + ["ID"]
-        writer.writerow(headers)
-
-        for i, job in enumerate(all_data):
-            # Prepare a list for the row's data, filling it with empty strings for each header initially
-            row_data = [""] * len(headers)
-
-            # Fill in the row's data based on the job's data
-            for header in job.keys():
-                # Find the index of this header and replace the empty string with actual data
-                header_index = headers.index(header)
-                row_data[header_index] = job[header]
-
-            # Add the job URL at the end
-            row_data[-2] = all_jobs_url[i]
-
-            # Add a unique ID for each job
-            row_data[-1] = str(uuid.uuid4())
+        reached_end = check_end_of_page(session)
+        if not new_cards and rendered_ids and not rendered_job_ids(session) - seen_ids:
+            # The last scroll didn't render any new job cards
+            reached_end = True
+
+    return all_data, all_jobs_url
+
+
+def search_query(pool, manager, search_keyword, location_keyword, headless=True, max_pages=SEARCH_MAX_PAGES):
+    # Reads up to `max_pages` results pages of one query, returns its jobs
+    # with their link in "job_link"
+    account = manager.account()
+    try:
+        storage_state_file = manager.storage_state(URL, account, headless)
+    except Exception as e:
+        # The search results are public
+        logging.error(f"Login was not successful ({e}), searching without login")
+        storage_state_file = None
+    rows = []
+    seen_ids = set()
+    for page in range(max(1, max_pages)):
+        manager.pace(account)
+        with pool.session(
+            search_url(search_keyword, location_keyword, page * SEARCH_PAGE_SIZE),
+            storage_state_file=storage_state_file,
+        ) as search_session:
+            page_data, page_urls = search_jobs(
+                search_session,
+                search_keyword,
+                location_keyword,
+                seen_ids,
+                search_form=page == 0,
+            )
+        pool.take_filter_stats()
+        # LinkedIn repeats the last page past the end of the results
+        if not page_data:
+            break
+        for job, job_url in zip(page_data, page_urls):
+            rows.append({**job, "job_link": job_url})
+    return rows
+
+
+def search_worker(tasks, output, pool, manager, headless):
+    # Searches queries from `tasks` until it is empty, in this thread's
+    # browser, and appends each query's jobs to `output`
+    try:
+        while True:
+            try:
+                search_keyword, location_keyword = tasks.get_nowait()
+            except queue.Empty:
+                return
+            label = query_label(search_keyword, location_keyword)
+            try:
+                with metrics.span("search_query", query=label) as span:
+                    rows = search_query(pool, manager, search_keyword, location_keyword, headless)
+                    span["jobs"] = len(rows)
+            except Exception as e:
+                logging.error(f"Search {label} failed: {e}")
+                rows = []
+            print(f"{len(rows)} jobs found for {label}")
+            for row in rows:
+                # The job link and the ID last, as in the CSV. A job found
+                # again keeps its first ID.
+                job_url = row.pop("job_link")
+                output.append({**row, "job_link": job_url, "ID": str(uuid.uuid4()), "queries": label})
+    finally:
+        pool.release()
+
+
+def search_and_collect_jobs_batch(queries, headless=True, max_workers=SEARCH_CONCURRENCY):
+    # Searches every (keyword, location) query, several at a time, and
+    # writes today's jobs to the CSV, one row per LinkedIn job ID. A job found
+    # by several queries lists them all in "queries".
+    pool = get_pool(headless)
+    manager = get_session_manager()
+    output = get_output()
+    tasks = queue.Queue()
+    for query in queries:
+        tasks.put(query)
+    workers = [
+        threading.Thread(
+            target=search_worker,
+            args=(tasks, output, pool, manager, headless),
+        )
+        for _ in range(max(1, min(max_workers, tasks.qsize())))
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
 
-            writer.writerow(row_data)
+    # Today's searches so far, so a serial run for other queries adds to
+    # the day's CSV instead of replacing it
+    written = output.export_csv(CSV_FILE, segments=[segment_name()])
+    print(f"Data saved to {CSV_FILE} ({written} jobs)")
 
-    search_session.stop()
 
-    data = pd.read_csv(CSV_FILE)
-    data = data.drop_duplicates(
-        subset=["job_title", "company_name", "city", "salary_range"]
-    ).copy()
-    # Clean the salary_range column
-    data["salary_range"] = data["salary_range"].apply(clean_text)
-    data.to_csv(CSV_FILE, index=False)
-    print(f"Data saved to {CSV_FILE}")
+def search_and_collect_jobs(search_keyword, location_keyword, headless=True):
+    search_and_collect_jobs_batch([(search_keyword, location_keyword)], headless)
 
 
 # search_and_collect_jobs("Data Scientist", "California, CA")
@@ -0,0 +1,180 @@
+import json
+import logging
+import os
+import threading
+import time
+
+from browser import invalidate_state
+from login import login_with_retry
+
+# JSON list of {"email": ..., "password": ..., "session_name": ...}; without
+# it the EMAIL / PASSWORD / LOGIN_SESSION_NAME account from .env is used
+ACCOUNTS_FILE = os.getenv("ACCOUNTS_FILE", "accounts.json")
+# Minimum seconds between two page loads of the same account
+ACCOUNT_MIN_INTERVAL = float(os.getenv("ACCOUNT_MIN_INTERVAL", "2"))
+# LinkedIn's authentication cookie
+AUTH_COOKIE = "li_at"
+# Log in again this many seconds before the cookie expires
+EXPIRY_MARGIN = 60 * 60
+# Seconds an account isn't logged in again after a failed login, doubled
+# after each further failure up to a day
+LOGIN_BACKOFF_SECONDS = float(os.getenv("LOGIN_BACKOFF_SECONDS", "600"))
+MAX_LOGIN_BACKOFF = 24 * 60 * 60
+
+
+class LoginError(Exception):
+    pass
+
+
+class Account:
+    def __init__(self, email, password, session_name):
+        self.email = email
+        self.password = password
+        self.session_name = session_name
+        self.state_file = f"{session_name}.json"
+        self.next_request_at = 0.0
+        # Held while the account logs in, so it only logs in once
+        self.login_lock = threading.Lock()
+        self.login_failures = 0
+        self.login_blocked_until = 0.0
+
+    def usable(self):
+        # False while the account backs off after failed logins
+        return self.login_blocked_until <= time.monotonic()
+
+    def login_failed(self, backoff=LOGIN_BACKOFF_SECONDS):
+        self.login_failures += 1
+        delay = min(MAX_LOGIN_BACKOFF, backoff * 2 ** (self.login_failures - 1))
+        self.login_blocked_until = time.monotonic() + delay
+        return delay
+
+    def __repr__(self):
+        return f"Account({self.email!r}, {self.session_name!r})"
+
+
+def load_accounts(path=ACCOUNTS_FILE):
+    if os.path.exists(path):
+        with open(path) as accounts_file:
+            entries = json.load(accounts_file)
+        return [
+            Account(
+                entry["email"],
+                entry["password"],
+                entry.get("session_name", f"linkedin_session_{i}"),
+            )
+            for i, entry in enumerate(entries)
+        ]
+    return [
+        Account(
+            os.getenv("EMAIL"),
+            os.getenv("PASSWORD"),
+            os.getenv("LOGIN_SESSION_NAME") or "linkedin_login_session",
+        )
+    ]
+
+
+def state_expires_at(state_file):
+    # Expiry time of the login cookie in a saved storage state, inf for a
+    # browser session cookie, None if the file or the cookie is missing
+    try:
+        with open(state_file) as state:
+            cookies = json.load(state).get("cookies", [])
+    except (OSError, ValueError) as e:
+        logging.info(f"Can't read the login state {state_file}: {e}")
+        return None
+    for cookie in cookies:
+        if cookie.get("name") == AUTH_COOKIE and cookie.get("value"):
+            expires = cookie.get("expires", -1)
+            return float("inf") if expires is None or expires < 0 else expires
+    return None
+
+
+def state_is_valid(state_file, margin=EXPIRY_MARGIN):
+    expires_at = state_expires_at(state_file)
+    return expires_at is not None and expires_at - margin > time.time()
+
+
+class SessionManager:
+    # Hands out LinkedIn accounts to worker threads round-robin, keeps each
+    # account's saved login state valid and spaces out its page loads.
+    # A thread keeps its account, so its browser keeps the same login state.
+
+    def __init__(self, accounts, min_interval=ACCOUNT_MIN_INTERVAL):
+        if not accounts:
+            raise ValueError("No LinkedIn account configured")
+        self.accounts = accounts
+        self.min_interval = min_interval
+        self._next = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def account(self):
+        # The thread's account, or the next usable one if it has none or its
+        # account backs off after failed logins
+        account = getattr(self._local, "account", None)
+        if account is None or not account.usable():
+            with self._lock:
+                for _ in range(len(self.accounts)):
+                    candidate = self.accounts[self._next % len(self.accounts)]
+                    self._next += 1
+                    if candidate.usable():
+                        account = candidate
+                        break
+                else:
+                    account = account or candidate
+            self._local.account = account
+        return account
+
+    def storage_state(self, url, account=None, headless=True):
+        # Returns the account's storage state file, logging in first if the
+        # saved login is missing or about to expire. Raises LoginError if the
+        # login failed, and without trying again while the account backs off.
+        account = account or self.account()
+        with account.login_lock:
+            if state_is_valid(account.state_file):
+                return account.state_file
+            if not account.usable():
+                remaining = account.login_blocked_until - time.monotonic()
+                raise LoginError(f"{account} failed to log in, not trying again for {remaining:.0f}s")
+            logging.info(f"Login state of {account} is missing or expired, logging in")
+            try:
+                login_with_retry(url, account.email, account.password, account.session_name, headless)
+                invalidate_state(account.state_file)
+                if not state_is_valid(account.state_file):
+                    raise LoginError(f"The new login state of {account} has no {AUTH_COOKIE} cookie")
+            except Exception as e:
+                delay = account.login_failed()
+                logging.warning(f"Login of {account} failed ({e}), not trying again for {delay:.0f}s")
+                raise
+            account.login_failures = 0
+        return account.state_file
+
+    def expire(self, account):
+        # Forgets a login state that LinkedIn rejected, the next
+        # `storage_state` call logs in again
+        with account.login_lock:
+            if os.path.exists(account.state_file):
+                os.remove(account.state_file)
+            invalidate_state(account.state_file)
+
+    def pace(self, account=None):
+        # Blocks until the account may load its next page
+        account = account or self.account()
+        with self._lock:
+            now = time.monotonic()
+            wait = account.next_request_at - now
+            account.next_request_at = max(now, account.next_request_at) + self.min_interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_session_manager():
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = SessionManager(load_accounts())
+        return _manager
@@ -0,0 +1,27 @@
+import logging
+import os
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+# Loaded once, on the first import. Entry points import this module before
+# any other, since most modules read their settings when they are imported.
+load_dotenv()
+
+# Job title and location searched when there is no queries file
+SEARCH_KEYWORD = "Data Scientist"
+LOCATION_KEYWORD = "California, CA"
+
+today = datetime.today().strftime("%Y_%m_%d")
+CSV_FILE = f"jobs_postings_{today}.csv"
+LOG_FILE = os.getenv("LOG_FILE", f"run_logs_{today}.log")
+
+
+def configure_logging(filename=LOG_FILE):
+    # The runs and workers of a day append to the same log
+    logging.basicConfig(
+        filename=filename,
+        filemode="a",
+        level=logging.INFO,
+        format="%(asctime)s:%(levelname)s:%(message)s",
+    )
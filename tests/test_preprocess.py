@@ -0,0 +1,95 @@
+import pytest
+
+import preprocess
+from preprocess import BoilerplateLearner, paragraph_hash, prepare_description
+
+ABOUT = (
+    "Acme builds the rockets, anvils and giant magnets that coyotes all over the "
+    "desert rely on every single day to catch their lunch."
+)
+PERKS = (
+    "We offer flexible hours, a yearly offsite in the desert and a generous budget "
+    "for conferences, books and any training you would like to take."
+)
+
+
+def posting(role, duties):
+    return "\n".join(
+        [
+            ABOUT,
+            f"As a {role} you will {duties}, working closely with the product and "
+            "design teams to ship features our customers love every week.",
+            PERKS,
+        ]
+    )
+
+
+POSTINGS = [
+    posting("data scientist", "build forecasting models for anvil demand across every region"),
+    posting("backend engineer", "design the order service that routes rocket shipments to warehouses"),
+    posting("product manager", "own the magnet roadmap and talk to coyotes about their hunting needs"),
+    posting("security analyst", "audit the dispatch systems and run the incident response drills"),
+]
+
+
+@pytest.fixture
+def learner(tmp_path, monkeypatch):
+    learner = BoilerplateLearner(str(tmp_path / "boilerplate.db"), min_postings=3, min_share=0.5)
+    monkeypatch.setattr(preprocess, "_learner", learner)
+    monkeypatch.setattr(preprocess, "PREPROCESS_DISABLED", False)
+    return learner
+
+
+def test_reposts_are_not_counted(learner):
+    description = "\n".join([ABOUT, PERKS])
+    for job_id in ["job0", "job1", "job2"]:
+        assert prepare_description(description, "Acme", job_id) == description
+
+
+def test_repeated_paragraphs_are_dropped(learner):
+    for job_id, description in enumerate(POSTINGS[:2]):
+        assert ABOUT in prepare_description(description, "Acme", str(job_id))
+    prompt = prepare_description(POSTINGS[2], "Acme", "2")
+    assert ABOUT not in prompt
+    assert PERKS not in prompt
+    assert "magnet roadmap" in prompt
+
+
+def test_boilerplate_only_posting_is_sent_whole(learner):
+    for job_id, description in enumerate(POSTINGS[:3]):
+        prepare_description(description, "Acme", str(job_id))
+    description = "\n".join([ABOUT, PERKS])
+    assert prepare_description(description, "Acme", "other") == description
+
+
+def test_paragraph_needs_a_share_of_the_postings(learner):
+    rare = paragraph_hash(ABOUT)
+    for job_id, description in enumerate(POSTINGS):
+        hashes = [paragraph_hash(line) for line in description.splitlines()]
+        if job_id >= 3:
+            hashes.remove(rare)
+        learner.learn("Acme", str(job_id), hashes)
+    others = [
+        posting(role, "take care of the many tasks listed in this rather long posting")
+        for role in ["designer", "writer", "recruiter", "accountant"]
+    ]
+    for job_id, description in enumerate(others, start=len(POSTINGS)):
+        hashes = [paragraph_hash(line) for line in description.splitlines()]
+        hashes.remove(rare)
+        learner.learn("Acme", str(job_id), hashes)
+    # In 3 of 8 distinct postings
+    assert rare not in learner.learn("Acme", "0", [rare])
+
+
+def test_relearning_a_posting_does_not_count_it_twice(learner):
+    hashes = [paragraph_hash(ABOUT)]
+    for _ in range(3):
+        assert learner.learn("Acme", "job0", hashes) == set()
+
+
+def test_companies_are_learned_apart(learner):
+    hashes = [paragraph_hash(ABOUT)]
+    learner.learn("Acme", "1", hashes)
+    learner.learn("Acme", "2", hashes)
+    assert learner.learn("Globex", "3", hashes) == set()
+    assert learner.learn("ACME ", "4", hashes) == set(hashes)
@@ -0,0 +1,257 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from http_fetch import HttpFetcher
+from retry import (
+    PERMANENT,
+    RATE_LIMITED,
+    TRANSIENT,
+    CircuitBreaker,
+    CircuitOpenError,
+    PermanentError,
+    RetryPolicy,
+    classify,
+)
+
+
+@pytest.fixture
+def breaker():
+    return CircuitBreaker("test", failure_threshold=2, reset_timeout=0.05)
+
+
+@pytest.fixture
+def policy():
+    return RetryPolicy(max_attempts=3, base_delay=0, max_delay=0)
+
+
+def open_circuit(breaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.before_call()
+        breaker.record_failure(TRANSIENT)
+
+
+def wait_for_probe(breaker):
+    time.sleep(breaker.reset_timeout * 2)
+
+
+class Failing:
+    # Raises the given errors in turn, then returns "ok"
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+def test_breaker_opens_at_the_threshold(breaker):
+    breaker.record_failure(TRANSIENT)
+    breaker.before_call()
+    breaker.record_failure(RATE_LIMITED)
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_success_resets_the_failure_count(breaker):
+    breaker.record_failure(TRANSIENT)
+    breaker.record_success()
+    breaker.record_failure(TRANSIENT)
+    breaker.before_call()
+
+
+def test_permanent_failures_do_not_open_the_circuit(breaker):
+    for _ in range(breaker.failure_threshold * 2):
+        breaker.record_failure(PERMANENT)
+    breaker.before_call()
+
+
+def test_one_probe_after_the_reset_timeout(breaker):
+    open_circuit(breaker)
+    wait_for_probe(breaker)
+    breaker.before_call()
+    assert breaker.probing
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_probe_success_closes_the_circuit(breaker):
+    open_circuit(breaker)
+    wait_for_probe(breaker)
+    breaker.before_call()
+    breaker.record_success()
+    assert not breaker.probing
+    breaker.before_call()
+    breaker.before_call()
+
+
+def test_probe_failure_reopens_the_circuit(breaker):
+    open_circuit(breaker)
+    wait_for_probe(breaker)
+    breaker.before_call()
+    breaker.record_failure(TRANSIENT)
+    assert not breaker.probing
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_probe_with_a_permanent_failure_closes_the_circuit(breaker):
+    open_circuit(breaker)
+    wait_for_probe(breaker)
+    breaker.before_call()
+    breaker.record_failure(PERMANENT)
+    breaker.before_call()
+
+
+def test_transient_errors_are_retried(policy):
+    fn = Failing(ConnectionError("reset"), TimeoutError("slow"))
+    span = {}
+    assert policy.call(fn, name="test", span=span) == "ok"
+    assert fn.calls == 3
+    assert span["retries"] == 2
+
+
+def test_gives_up_after_max_attempts(policy):
+    fn = Failing(*[ConnectionError("reset")] * 3)
+    given_up = []
+    span = {}
+    with pytest.raises(ConnectionError) as error:
+        policy.call(fn, name="test", span=span, on_give_up=lambda e, kind: given_up.append(kind))
+    assert fn.calls == 3
+    assert given_up == [TRANSIENT]
+    assert span["gave_up"] == TRANSIENT
+    assert error.value.gave_up
+
+
+def test_permanent_errors_are_not_retried(policy):
+    fn = Failing(PermanentError("gone"))
+    with pytest.raises(PermanentError):
+        policy.call(fn, name="test")
+    assert fn.calls == 1
+
+
+def test_inner_error_is_not_retried_and_keeps_its_kind(policy):
+    inner = ConnectionError("reset")
+    with pytest.raises(ConnectionError):
+        policy.call(Failing(inner, inner, inner), name="inner")
+    outer = Failing(inner)
+    with pytest.raises(ConnectionError):
+        policy.call(outer, name="outer")
+    assert outer.calls == 1
+    assert classify(inner) == TRANSIENT
+
+
+def test_inner_error_is_not_counted_twice(policy, breaker):
+    inner = ConnectionError("reset")
+    inner.gave_up = True
+    inner.kind = TRANSIENT
+    with pytest.raises(ConnectionError):
+        policy.call(Failing(inner), name="test", breaker=breaker)
+    assert breaker.failures == 0
+
+
+def test_inner_error_settles_a_probe(policy, breaker):
+    open_circuit(breaker)
+    wait_for_probe(breaker)
+    inner = ConnectionError("reset")
+    inner.gave_up = True
+    inner.kind = TRANSIENT
+    with pytest.raises(ConnectionError):
+        policy.call(Failing(inner), name="test", breaker=breaker)
+    assert not breaker.probing
+    wait_for_probe(breaker)
+    breaker.before_call()
+
+
+def test_inner_open_circuit_settles_the_outer_probe(policy, breaker):
+    open_circuit(breaker)
+    wait_for_probe(breaker)
+    inner_breaker = CircuitBreaker("inner", failure_threshold=1, reset_timeout=60)
+    inner_breaker.record_failure(TRANSIENT)
+    with pytest.raises(CircuitOpenError):
+        RetryPolicy(max_attempts=1).call(
+            lambda: policy.call(lambda: "ok", name="inner", breaker=inner_breaker),
+            name="outer",
+            breaker=breaker,
+        )
+    assert not breaker.probing
+
+
+def test_open_circuit_is_not_counted(policy, breaker):
+    open_circuit(breaker)
+    failures = breaker.failures
+    with pytest.raises(CircuitOpenError):
+        RetryPolicy(max_attempts=1).call(lambda: "ok", name="test", breaker=breaker)
+    assert breaker.failures == failures
+
+
+def test_cancelled_probe_is_settled(policy, breaker):
+    open_circuit(breaker)
+    wait_for_probe(breaker)
+
+    async def run():
+        task = asyncio.create_task(policy.acall(asyncio.sleep, 10, name="test", breaker=breaker))
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    assert not breaker.probing
+
+
+def fetcher_answering(handler, breaker):
+    fetcher = HttpFetcher()
+    fetcher.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    fetcher.breaker = breaker
+    return fetcher
+
+
+@pytest.mark.parametrize("status", [404, 410])
+def test_http_probe_of_a_gone_posting_closes_the_circuit(breaker, status):
+    open_circuit(breaker)
+    wait_for_probe(breaker)
+    fetcher = fetcher_answering(lambda request: httpx.Response(status), breaker)
+    with pytest.raises(PermanentError):
+        asyncio.run(fetcher.fetch("https://www.linkedin.com/jobs/view/1"))
+    assert not breaker.probing
+    breaker.before_call()
+
+
+def test_http_probe_error_reopens_the_circuit(breaker):
+    open_circuit(breaker)
+    wait_for_probe(breaker)
+
+    def handler(request):
+        raise ValueError("broken transport")
+
+    fetcher = fetcher_answering(handler, breaker)
+    assert asyncio.run(fetcher.fetch("https://www.linkedin.com/jobs/view/1")) == {}
+    assert not breaker.probing
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_cancelled_http_probe_is_settled(breaker):
+    open_circuit(breaker)
+    wait_for_probe(breaker)
+
+    async def handler(request):
+        await asyncio.sleep(10)
+
+    fetcher = fetcher_answering(handler, breaker)
+
+    async def run():
+        task = asyncio.create_task(fetcher.fetch("https://www.linkedin.com/jobs/view/1"))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    assert not breaker.probing
@@ -0,0 +1,167 @@
+import time
+
+import pytest
+
+from work_queue import DONE, FAILED, LEASED, QUEUED, SQLiteWorkQueue, WorkQueue
+
+
+@pytest.fixture
+def work_queue(tmp_path):
+    return SQLiteWorkQueue(str(tmp_path / "work_queue.db"), max_deliveries=3)
+
+
+def expire(task_queue, seconds=0.05):
+    # Leases for `seconds`, then waits for the lease to run out
+    tasks = task_queue.lease("dead-worker", lease_seconds=seconds)
+    time.sleep(seconds * 2)
+    return tasks
+
+
+def test_enqueue_is_keyed_by_job_id(work_queue):
+    assert work_queue.enqueue("1", "link-1", {"job_title": "a"})
+    assert not work_queue.enqueue("1", "link-1", {"job_title": "b"})
+    [task] = work_queue.lease("w1")
+    assert task["payload"] == {"job_title": "a"}
+    assert work_queue.counts()[LEASED] == 1
+
+
+def test_leased_task_is_not_handed_out_twice(work_queue):
+    work_queue.enqueue("1", "link-1", {})
+    assert len(work_queue.lease("w1", count=5)) == 1
+    assert work_queue.lease("w2", count=5) == []
+    assert not work_queue.drained()
+
+
+def test_expired_lease_is_delivered_again(work_queue):
+    work_queue.enqueue("1", "link-1", {})
+    [first] = expire(work_queue)
+    [second] = work_queue.lease("w2")
+    assert second["deliveries"] == 2
+    assert second["lease_token"] != first["lease_token"]
+    assert not work_queue.renew(first)
+    assert work_queue.renew(second)
+
+
+def test_renewed_lease_does_not_expire(work_queue):
+    work_queue.enqueue("1", "link-1", {})
+    [task] = work_queue.lease("w1", lease_seconds=0.05)
+    assert work_queue.renew(task, lease_seconds=60)
+    time.sleep(0.1)
+    assert work_queue.lease("w2") == []
+
+
+def test_task_fails_after_max_deliveries(work_queue):
+    work_queue.enqueue("1", "link-1", {})
+    for _ in range(3):
+        assert expire(work_queue)
+    assert work_queue.lease("w1") == []
+    assert work_queue.counts()[FAILED] == 1
+    assert work_queue.drained()
+
+
+def test_fail_requeues_until_max_deliveries(work_queue):
+    work_queue.enqueue("1", "link-1", {})
+    for deliveries in range(1, 4):
+        [task] = work_queue.lease("w1")
+        assert task["deliveries"] == deliveries
+        work_queue.fail(task, "timeout")
+    assert work_queue.counts()[FAILED] == 1
+
+
+def test_permanent_failure_is_not_retried(work_queue):
+    work_queue.enqueue("1", "link-1", {})
+    [task] = work_queue.lease("w1")
+    work_queue.fail(task, "404", permanent=True)
+    assert work_queue.lease("w1") == []
+    assert work_queue.counts()[FAILED] == 1
+
+
+def test_first_completion_wins(work_queue):
+    work_queue.enqueue("1", "link-1", {})
+    [first] = expire(work_queue)
+    [second] = work_queue.lease("w2")
+    assert work_queue.complete(second, {"extraction": "second"})
+    assert not work_queue.complete(first, {"extraction": "first"})
+    assert work_queue.results(["1"]) == {"1": {"extraction": "second"}}
+    assert work_queue.counts()[DONE] == 1
+
+
+def test_stale_worker_may_complete_a_task_nobody_finished(work_queue):
+    work_queue.enqueue("1", "link-1", {})
+    [first] = expire(work_queue)
+    work_queue.lease("w2")
+    assert work_queue.complete(first, {"extraction": "first"})
+    assert work_queue.results(["1"]) == {"1": {"extraction": "first"}}
+
+
+def test_fail_with_stale_token_is_ignored(work_queue):
+    work_queue.enqueue("1", "link-1", {})
+    [first] = expire(work_queue)
+    [second] = work_queue.lease("w2")
+    work_queue.fail(first, "late failure", permanent=True)
+    assert work_queue.counts()[LEASED] == 1
+    assert work_queue.renew(second)
+    assert work_queue.complete(second, {"extraction": "ok"})
+
+
+def test_fail_after_completion_is_ignored(work_queue):
+    work_queue.enqueue("1", "link-1", {})
+    [task] = work_queue.lease("w1")
+    work_queue.complete(task, {"extraction": "ok"})
+    work_queue.fail(task, "late failure")
+    assert work_queue.counts() == {QUEUED: 0, LEASED: 0, DONE: 1, FAILED: 0}
+
+
+def test_queue_is_shared_between_connections(tmp_path):
+    path = str(tmp_path / "work_queue.db")
+    coordinator = SQLiteWorkQueue(path)
+    worker = SQLiteWorkQueue(path)
+    coordinator.enqueue("1", "link-1", {"job_title": "a"})
+    [task] = worker.lease("w1")
+    worker.complete(task, {"extraction": "ok"})
+    assert coordinator.results(["1"]) == {"1": {"extraction": "ok"}}
+    assert coordinator.drained()
+
+
+def test_failed_task_is_queued_again_on_the_next_run(work_queue):
+    work_queue.enqueue("1", "link-1", {})
+    for _ in range(3):
+        [task] = work_queue.lease("w1")
+        work_queue.fail(task, "timeout")
+    assert work_queue.drained()
+    assert work_queue.enqueue("1", "link-1", {})
+    [task] = work_queue.lease("w1")
+    assert task["deliveries"] == 1
+
+
+def test_permanently_failed_task_is_not_queued_again(work_queue):
+    work_queue.enqueue("1", "link-1", {})
+    [task] = work_queue.lease("w1")
+    work_queue.fail(task, "404", permanent=True)
+    assert not work_queue.enqueue("1", "link-1", {})
+    assert work_queue.drained()
+
+
+def test_done_task_is_not_queued_again(work_queue):
+    work_queue.enqueue("1", "link-1", {})
+    [task] = work_queue.lease("w1")
+    work_queue.complete(task, {"extraction": "ok"})
+    assert not work_queue.enqueue("1", "link-1", {})
+    assert work_queue.counts()[DONE] == 1
+
+
+def test_results_are_limited_to_the_given_jobs(work_queue):
+    for job_id in ("1", "2"):
+        work_queue.enqueue(job_id, f"link-{job_id}", {})
+    for task in work_queue.lease("w1", count=2):
+        work_queue.complete(task, {"extraction": task["job_id"]})
+    assert work_queue.results(["2", "3"]) == {"2": {"extraction": "2"}}
+
+
+def test_incomplete_backend_fails_when_created():
+    class Incomplete(WorkQueue):
+        def enqueue(self, job_id, job_link, payload):
+            return True
+
+    with pytest.raises(TypeError):
+        Incomplete()
@@ -0,0 +1,47 @@
+import logging
+import threading
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Encoding of gpt-3.5-turbo and gpt-4
+ENCODING = "cl100k_base"
+# Without tiktoken: roughly four characters per token for English text
+CHARS_PER_TOKEN = 4
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+
+def get_encoding():
+    # The tiktoken encoding, or None if tiktoken is missing or can't load it
+    global _encoding, tiktoken
+    with _encoding_lock:
+        if _encoding is None and tiktoken is not None:
+            try:
+                _encoding = tiktoken.get_encoding(ENCODING)
+            except Exception as e:
+                # The encoding is downloaded on first use
+                logging.warning(f"Could not load the {ENCODING} encoding, estimating tokens: {e}")
+                tiktoken = None
+        return _encoding
+
+
+def count_tokens(text):
+    encoding = get_encoding()
+    if encoding is None:
+        return len(text) // CHARS_PER_TOKEN
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text, max_tokens):
+    # The longest prefix of `text` with at most `max_tokens` tokens
+    encoding = get_encoding()
+    if encoding is None:
+        return text[: max_tokens * CHARS_PER_TOKEN]
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
@@ -0,0 +1,302 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+
+# Backend shared by the coordinator and its workers, see BACKENDS
+WORK_QUEUE_BACKEND = os.getenv("WORK_QUEUE_BACKEND", "sqlite")
+# SQLite file of the "sqlite" backend, on a disk every worker can reach
+WORK_QUEUE_DB = os.getenv("WORK_QUEUE_DB", "work_queue.db")
+# A task whose worker didn't renew its lease for this many seconds is
+# handed out again
+LEASE_SECONDS = float(os.getenv("LEASE_SECONDS", "300"))
+# Deliveries of a task before it is given up
+MAX_DELIVERIES = int(os.getenv("MAX_DELIVERIES", "5"))
+
+# Task states
+QUEUED = "queued"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+
+class WorkQueue(ABC):
+    # Job postings shared between a coordinator and any number of workers.
+    # Delivery is at least once: a task leased by a worker that died is
+    # leased again once its lease expired, so a posting may be processed
+    # twice. Writes are keyed by job ID, the first completion of a task is
+    # kept and later ones are ignored.
+
+    @abstractmethod
+    def enqueue(self, job_id, job_link, payload):
+        # Adds a task unless the job ID is queued, leased or done already.
+        # A task that failed, but not permanently, is queued again with its
+        # deliveries reset. Returns whether it was (re)queued.
+        pass
+
+    @abstractmethod
+    def lease(self, worker_id, count=1, lease_seconds=LEASE_SECONDS):
+        # Up to `count` queued or expired tasks, as dicts with the job_id,
+        # job_link, payload, lease token and number of deliveries
+        pass
+
+    @abstractmethod
+    def renew(self, task, lease_seconds=LEASE_SECONDS):
+        # Extends a lease still held by the task's worker, returns whether it was
+        pass
+
+    @abstractmethod
+    def complete(self, task, result):
+        # Stores the result of a task, returns False if it was done already
+        pass
+
+    @abstractmethod
+    def fail(self, task, error, permanent=False):
+        # Gives the task back to the queue, or gives up on it when it is
+        # permanent or was delivered MAX_DELIVERIES times
+        pass
+
+    @abstractmethod
+    def counts(self):
+        # Number of tasks per state
+        pass
+
+    @abstractmethod
+    def results(self, job_ids):
+        # Job ID -> result of the done tasks among `job_ids`
+        pass
+
+    def drained(self):
+        # No task is waiting or being worked on
+        counts = self.counts()
+        return counts[QUEUED] + counts[LEASED] == 0
+
+
+class SQLiteWorkQueue(WorkQueue):
+    # Work queue in a SQLite file, for the workers of one machine or of
+    # machines sharing a disk. Every lease and write is its own transaction.
+
+    def __init__(self, path=WORK_QUEUE_DB, max_deliveries=MAX_DELIVERIES):
+        self.path = path
+        self.max_deliveries = max_deliveries
+        self._lock = threading.Lock()
+        # Autocommit, transactions are opened explicitly
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS tasks (
+                job_id TEXT PRIMARY KEY,
+                job_link TEXT NOT NULL,
+                payload TEXT,
+                state TEXT NOT NULL,
+                worker_id TEXT,
+                lease_token TEXT,
+                lease_expires_at REAL,
+                deliveries INTEGER NOT NULL DEFAULT 0,
+                result TEXT,
+                error TEXT,
+                permanent INTEGER NOT NULL DEFAULT 0,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        # Added after the first release, older queues gain it in place
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(tasks)")}
+        if "permanent" not in columns:
+            self._conn.execute("ALTER TABLE tasks ADD COLUMN permanent INTEGER NOT NULL DEFAULT 0")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS tasks_state ON tasks (state, lease_expires_at)")
+
+    def _transaction(self, work):
+        # Runs `work(conn)` in a write transaction, so two workers never
+        # lease the same task
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = work(self._conn)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+
+    def enqueue(self, job_id, job_link, payload):
+        cursor = self._transaction(
+            lambda conn: conn.execute(
+                """
+                INSERT INTO tasks (job_id, job_link, payload, state, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (job_id) DO UPDATE SET
+                    job_link = excluded.job_link, payload = excluded.payload, state = excluded.state,
+                    worker_id = NULL, deliveries = 0, error = NULL, updated_at = excluded.updated_at
+                WHERE tasks.state = ? AND NOT tasks.permanent
+                """,
+                (job_id, job_link, json.dumps(payload, default=str), QUEUED, time.time(), FAILED),
+            )
+        )
+        return cursor.rowcount == 1
+
+    def lease(self, worker_id, count=1, lease_seconds=LEASE_SECONDS):
+        def work(conn):
+            now = time.time()
+            rows = conn.execute(
+                """
+                SELECT * FROM tasks
+                WHERE state = ? OR (state = ? AND lease_expires_at < ?)
+                ORDER BY updated_at LIMIT ?
+                """,
+                (QUEUED, LEASED, now, count),
+            ).fetchall()
+            tasks = []
+            for row in rows:
+                if row["state"] == LEASED:
+                    logging.warning(f"Lease of job {row['job_id']} by {row['worker_id']} expired, leasing it again")
+                if row["deliveries"] >= self.max_deliveries:
+                    conn.execute(
+                        "UPDATE tasks SET state = ?, error = ?, updated_at = ? WHERE job_id = ?",
+                        (FAILED, f"Not completed after {row['deliveries']} deliveries", now, row["job_id"]),
+                    )
+                    continue
+                token = uuid.uuid4().hex
+                conn.execute(
+                    """
+                    UPDATE tasks SET state = ?, worker_id = ?, lease_token = ?,
+                        lease_expires_at = ?, deliveries = deliveries + 1, updated_at = ?
+                    WHERE job_id = ?
+                    """,
+                    (LEASED, worker_id, token, now + lease_seconds, now, row["job_id"]),
+                )
+                tasks.append(
+                    {
+                        "job_id": row["job_id"],
+                        "job_link": row["job_link"],
+                        "payload": json.loads(row["payload"]) if row["payload"] else {},
+                        "lease_token": token,
+                        "deliveries": row["deliveries"] + 1,
+                    }
+                )
+            return tasks
+
+        return self._transaction(work)
+
+    def renew(self, task, lease_seconds=LEASE_SECONDS):
+        cursor = self._transaction(
+            lambda conn: conn.execute(
+                """
+                UPDATE tasks SET lease_expires_at = ?
+                WHERE job_id = ? AND state = ? AND lease_token = ?
+                """,
+                (time.time() + lease_seconds, task["job_id"], LEASED, task["lease_token"]),
+            )
+        )
+        return cursor.rowcount == 1
+
+    def complete(self, task, result):
+        # A worker whose lease expired may still complete the task if nobody
+        # else did, its result is as good
+        cursor = self._transaction(
+            lambda conn: conn.execute(
+                """
+                UPDATE tasks SET state = ?, result = ?, error = NULL, lease_token = NULL,
+                    lease_expires_at = NULL, updated_at = ?
+                WHERE job_id = ? AND state != ?
+                """,
+                (DONE, json.dumps(result, default=str), time.time(), task["job_id"], DONE),
+            )
+        )
+        return cursor.rowcount == 1
+
+    def fail(self, task, error, permanent=False):
+        def work(conn):
+            row = conn.execute(
+                "SELECT state, lease_token, deliveries FROM tasks WHERE job_id = ?",
+                (task["job_id"],),
+            ).fetchone()
+            # Leased again by another worker, or done meanwhile
+            if row is None or row["state"] != LEASED or row["lease_token"] != task["lease_token"]:
+                return
+            state = FAILED if permanent or row["deliveries"] >= self.max_deliveries else QUEUED
+            conn.execute(
+                """
+                UPDATE tasks SET state = ?, error = ?, permanent = ?, lease_token = NULL,
+                    lease_expires_at = NULL, updated_at = ?
+                WHERE job_id = ?
+                """,
+                (state, str(error), int(permanent), time.time(), task["job_id"]),
+            )
+
+        self._transaction(work)
+
+    def counts(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT state, COUNT(*) FROM tasks GROUP BY state").fetchall()
+        counts = dict.fromkeys([QUEUED, LEASED, DONE, FAILED], 0)
+        counts.update({state: count for state, count in rows})
+        return counts
+
+    def results(self, job_ids):
+        job_ids = list(job_ids)
+        results = {}
+        # A few hundred at a time, under SQLite's limit on query parameters
+        for start in range(0, len(job_ids), 500):
+            chunk = job_ids[start : start + 500]
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT job_id, result FROM tasks WHERE state = ? AND job_id IN ({','.join('?' * len(chunk))})",
+                    [DONE, *chunk],
+                ).fetchall()
+            results.update({row["job_id"]: json.loads(row["result"]) for row in rows})
+        return results
+
+
+# Name -> work queue class; another backend (e.g. Redis) only needs to
+# implement WorkQueue and be added here
+BACKENDS = {"sqlite": SQLiteWorkQueue}
+
+
+class LeaseKeeper:
+    # Renews the leases of the tasks a worker is processing every third of
+    # the lease time, until it is stopped
+
+    def __init__(self, work_queue, tasks, lease_seconds=LEASE_SECONDS):
+        self.work_queue = work_queue
+        self.tasks = tasks
+        self.lease_seconds = lease_seconds
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stopped.wait(self.lease_seconds / 3):
+            for task in self.tasks:
+                try:
+                    if not self.work_queue.renew(task, self.lease_seconds):
+                        logging.warning(f"Lost the lease of job {task['job_id']}")
+                except Exception as e:
+                    logging.error(f"Could not renew the lease of job {task['job_id']}: {e}")
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stopped.set()
+        self._thread.join()
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_work_queue(backend=WORK_QUEUE_BACKEND):
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            if backend not in BACKENDS:
+                raise ValueError(f"Unknown work queue backend {backend!r}, expected one of {sorted(BACKENDS)}")
+            _queue = BACKENDS[backend]()
+        return _queue